@@ -3,8 +3,35 @@
 # @Date    : 2018-04-03 14:42:49
 # @Author  : Shanming Liu
 
-from .gerrit import Gerrit
+import importlib
 
-from .utils.helper import get_logger, expand_dot_dict
+# public names and their modules, imported on first access so that
+# `import api` does not load requests and friends before they are used
+_EXPORTS = {
+    'Gerrit': '.gerrit',
+    'AsyncGerrit': '.async_gerrit',
+    'AccountIndex': '.index',
+    'GroupGraph': '.graph',
+    'ChangeSync': '.sync',
+    'ChangeStore': '.store',
+    'ReviewBatcher': '.review',
+    'get_logger': '.utils.helper',
+    'expand_dot_dict': '.utils.helper',
+    'MetricsCollector': '.utils.metrics',
+    'GerritError': '.utils.exceptions',
+}
 
-from .utils.exceptions import GerritError
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError('module %r has no attribute %r'
+                             % (__name__, name))
+    value = getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -14,9 +14,16 @@ from .utils import uri
 class Account(helper.GerritMixin):
     """Gerrit Account"""
 
-    def __init__(self, gerrit, account_id):
+    __slots__ = ('account_id',)
+
+    # AccountInfo
+    FIELDS = frozenset([
+        '_account_id', 'name', 'display_name', 'email', 'secondary_emails',
+        'username', 'avatars', 'status', 'inactive', 'tags'])
+
+    def __init__(self, gerrit, account_id, data=None):
         super().__init__(gerrit,
-                         uri.Account.format(account_id=account_id))
+                         uri.Account.format(account_id=account_id), data)
         self.account_id = account_id
 
     def details(self):
@@ -258,8 +265,9 @@ If the user doesn’t have the global capability the response is “404 Not Foun
         if ret_type:
             from .groups import Group
             groups = filter(lambda x: 'group_id' in x, resp)
-            group_ids = sorted(map(lambda x: x['group_id'], groups))
-            return [Group(self.gerrit, gid) for gid in group_ids]
+            groups = sorted(groups, key=lambda x: x['group_id'])
+            return [Group(self.gerrit, item['group_id'], item)
+                    for item in groups]
         return resp
 
     def preferences(self,):
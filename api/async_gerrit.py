@@ -0,0 +1,564 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Date    : 2026-10-17 10:12:31
+# @Author  : Shanming Liu
+
+"""asyncio counterpart of the Gerrit client.
+
+The endpoint classes are shared with the blocking client: with an
+AsyncGerritSession every `self.session.get(...)` returns a coroutine,
+so methods like `Change.info()`, `Revision.files()` or `Branch.create()`
+become awaitable as they are. Only methods which post-process the
+response or send several requests are overridden here.
+
+Requires aiohttp.
+"""
+
+import asyncio
+import collections
+import inspect
+import pathlib
+import time
+
+from .utils import helper
+from .utils import options
+from .utils import uri
+from .changes import Change, Revision
+from .projects import Branch, Project, Tag
+from .groups import Group
+from .accounts import Account
+from .gerrit import Gerrit
+from .utils.exceptions import GerritError
+
+
+async def paginate(session, url, params=None, more_key=None, page_size=None,
+                   start_key='S', limit_key='n'):
+    """Async version of helper.paginate, yielding items one by one."""
+    params = dict(params or {})
+    start = params.pop(start_key, None) or 0
+    more = True
+    while more:
+        params[start_key] = start
+        params[limit_key] = page_size
+        page = await session.get(url, params=params)
+        items, more = helper.page_items(page, more_key, page_size)
+        start += len(items)
+        for item in items:
+            yield item
+
+
+async def run_batch(func, items, workers=8, progress=None):
+    """
+    Async version of helper.run_batch: await func for every item with
+    at most workers calls in flight.
+    :param func: callable returning an awaitable, or a plain value
+    :param progress: optional callable(done, total, result)
+    :return: list of helper.BatchResult in input order
+    """
+    items = list(items)
+    semaphore = asyncio.Semaphore(workers)
+    done = 0
+
+    async def call(item):
+        nonlocal done
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                result, error = func(item), None
+                if inspect.isawaitable(result):
+                    result = await result
+            except Exception as e:
+                result, error = None, e
+            result = helper.BatchResult(item, result, error,
+                                        time.perf_counter() - start)
+        done += 1
+        if progress is not None:
+            progress(done, len(items), result)
+        return result
+
+    return list(await asyncio.gather(*(call(item) for item in items)))
+
+
+class AsyncGerritSession(object):
+    """aiohttp based session with the same request semantics
+    as GerritSession."""
+
+    def __init__(self, username, password, timeout=10, logger=None,
+                 limit=100):
+        """
+        :param limit: max number of requests in flight at the same time
+        """
+        import aiohttp
+
+        self._aiohttp = aiohttp
+        self.auth = aiohttp.BasicAuth(username, password) \
+            if username else None
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.limit = limit
+        self.logger = logger if logger else helper.get_logger('GerritSession')
+        self._semaphore = None
+        self._session = None
+
+    def _client(self):
+        # created lazily as both need a running event loop
+        if self._session is None or self._session.closed:
+            connector = self._aiohttp.TCPConnector(limit=self.limit)
+            self._session = self._aiohttp.ClientSession(
+                auth=self.auth, timeout=self.timeout, connector=connector)
+            self._semaphore = asyncio.Semaphore(self.limit)
+        return self._session
+
+    @staticmethod
+    def _url(url, params):
+        from yarl import URL
+
+        if params:
+            # remove not exists value from params
+            query = helper.clean_params(params)
+            if query:
+                url += ('&' if '?' in url else '?') + query
+        return URL(url, encoded=True)
+
+    async def _check(self, resp):
+        if resp.status >= 400:
+            content = await resp.read()
+            text = content.decode(resp.charset or 'utf-8', 'replace')
+            self.logger.error('Error: %s %s', resp.status, resp.url)
+            self.logger.error('Reason: %s', text)
+            raise GerritError(text)
+
+    async def request(self, method, url, params=None, **kwargs):
+        url = self._url(url, params)
+        client = self._client()
+        async with self._semaphore:
+            self.logger.debug('Send %s request: %s', method, url)
+            async with client.request(method, url, **kwargs) as resp:
+                await self._check(resp)
+                content = await resp.read()
+        return helper.decode_content(content, resp.charset)
+
+    def get(self, url, params=None, **kwargs):
+        return self.request('GET', url, params=params, **kwargs)
+
+    def put(self, url, data=None, **kwargs):
+        return self.request('PUT', url, data=data, **kwargs)
+
+    def post(self, url, data=None, json=None, **kwargs):
+        return self.request('POST', url, data=data, json=json, **kwargs)
+
+    def delete(self, url, **kwargs):
+        return self.request('DELETE', url, **kwargs)
+
+    async def download(self, url, dest, params=None, base64=False,
+                       resume=False, chunk_size=1 << 20):
+        """Async version of GerritSession.download."""
+        if hasattr(dest, 'write'):
+            await self._download(url, dest, params, base64, 0, chunk_size)
+            return dest
+        dest = pathlib.Path(dest)
+        if resume and dest.exists():
+            return dest
+        part, offset = helper.part_file(dest, resume and not base64)
+        with part.open('ab' if offset else 'wb') as out_file:
+            await self._download(url, out_file, params, base64, offset,
+                                 chunk_size)
+        part.replace(dest)
+        return dest
+
+    async def _download(self, url, out_file, params, base64, offset,
+                        chunk_size):
+        headers = {'Range': 'bytes=%d-' % offset} if offset else None
+        url = self._url(url, params)
+        client = self._client()
+        async with self._semaphore:
+            self.logger.debug('Send GET request: %s', url)
+            async with client.get(url, headers=headers) as resp:
+                await self._check(resp)
+                if offset and resp.status != 206:
+                    # range ignored, the whole body is sent again
+                    out_file.seek(0)
+                    out_file.truncate()
+                decoder = helper.Base64Decoder() if base64 else None
+                async for chunk in resp.content.iter_chunked(chunk_size):
+                    out_file.write(decoder.decode(chunk) if decoder
+                                   else chunk)
+                if decoder:
+                    out_file.write(decoder.flush())
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+
+
+class AsyncProject(Project):
+    """Project whose list methods are coroutines."""
+
+    __slots__ = ()
+
+    async def branches(self, **params):
+        url = self.baseurl + '/branches'
+        resp = await self.session.get(url, params=params)
+        return [Branch(self.gerrit, self, branch['ref'], branch)
+                for branch in resp]
+
+    async def iter_branches(self, **params):
+        # the response is parsed once downloaded
+        for branch in await self.session.get(self.baseurl + '/branches',
+                                             params=params):
+            yield Branch(self.gerrit, self, branch['ref'], branch)
+
+    async def create_branch(self, branch_name, revision=None):
+        branch = self.branch(branch_name)
+        await branch.create(revision)
+        return branch
+
+    async def children(self):
+        url = self.baseurl + '/children'
+        resp = await self.session.get(url)
+        return [AsyncProject(self.gerrit, item['id'], item)
+                for item in resp]
+
+    async def tags(self, **params):
+        url = self.baseurl + '/tags'
+        resp = await self.session.get(url, params=params)
+        return [Tag(self.gerrit, self, item['ref'], item) for item in resp]
+
+    async def create_branches(self, branches, revision=None,
+                              workers=8, progress=None):
+        def create(branch):
+            name, base = branch if isinstance(branch, tuple) \
+                else (branch, revision)
+            return self.branch(name).create(base)
+
+        return await run_batch(create, branches, workers, progress)
+
+    async def create_tags(self, tags, revision=None, message=None,
+                          workers=8, progress=None):
+        def create(tag):
+            name, base = tag if isinstance(tag, tuple) else (tag, revision)
+            return self.tag(name).create(base, message)
+
+        return await run_batch(create, tags, workers, progress)
+
+    async def delete_tags(self, *tags):
+        url = self.baseurl + '/tags:delete'
+        data = {
+            'tags': tags
+        }
+        return await self.session.post(url, json=data)
+
+    async def _remove_refs(self, batch_delete, ref, names, workers,
+                           progress):
+        # remove_branches and remove_tags return this coroutine
+        names = list(names)
+        start = time.perf_counter()
+        try:
+            await batch_delete(*names)
+        except GerritError:
+            self.logger.warning('Batch delete failed on %s, '
+                                'deleting refs one by one', self)
+        else:
+            return self._removed(names, time.perf_counter() - start,
+                                 progress)
+
+        async def delete(name):
+            target = ref(name)
+            try:
+                return await target.delete()
+            except GerritError as e:
+                try:
+                    await target.info()
+                except GerritError:
+                    # already gone, deleted by the failed batch
+                    return None
+                raise e
+
+        return await run_batch(delete, names, workers, progress)
+
+
+class AsyncGroup(Group):
+    """Group whose list methods are coroutines."""
+
+    __slots__ = ()
+
+    async def members(self, recursive=False, ret_type=False):
+        url = self.baseurl + '/members'
+        if recursive:
+            url += '?recursive'
+        resp = await self.session.get(url)
+        if ret_type:
+            resp = sorted(resp, key=lambda x: x['_account_id'])
+            return [AsyncAccount(self.gerrit, item['_account_id'], item)
+                    for item in resp]
+        return resp
+
+    async def iter_members(self, recursive=False, ret_type=False):
+        # the response is parsed once downloaded
+        url = self.baseurl + '/members'
+        if recursive:
+            url += '?recursive'
+        for item in await self.session.get(url):
+            yield AsyncAccount(self.gerrit, item['_account_id'], item) \
+                if ret_type else item
+
+    def account(self, account_id):
+        return AsyncAccount(self.gerrit, account_id)
+
+    async def groups(self):
+        url = self.baseurl + '/groups/'
+        resp = await self.session.get(url)
+        return [AsyncGroup(self.gerrit, item['group_id'], item)
+                for item in resp]
+
+
+class AsyncAccount(Account):
+    """Account whose list methods are coroutines."""
+
+    __slots__ = ()
+
+    async def groups(self, ret_type=False):
+        url = self.baseurl + '/groups'
+        resp = await self.session.get(url)
+        if ret_type:
+            groups = filter(lambda x: 'group_id' in x, resp)
+            groups = sorted(groups, key=lambda x: x['group_id'])
+            return [AsyncGroup(self.gerrit, item['group_id'], item)
+                    for item in groups]
+        return resp
+
+
+class AsyncGerrit(Gerrit):
+    """asyncio Gerrit client, every request method is awaitable.
+
+    Example:
+        >>> async with AsyncGerrit(url, user, token, limit=200) as gerrit:
+        >>>     infos = await asyncio.gather(
+        >>>         *(gerrit.change(c).info() for c in change_ids))
+    """
+
+    def __init__(self, baseurl, username=None,
+                 password=None, level='INFO', limit=100, timeout=10):
+        """
+        :param limit: max number of requests in flight at the same time
+        :param timeout: total timeout of one request in seconds
+        """
+        self.baseurl = baseurl.rstrip('/')
+        self.username = username
+        self.password = password
+        self.logger = logger = helper.get_logger('AsyncGerrit', level)
+        self.session = AsyncGerritSession(username, password,
+                                          timeout=timeout, logger=logger,
+                                          limit=limit)
+
+    async def close(self):
+        await self.session.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def changes(self, query=None, limit=None, option=None,
+                      ret_type=False, fields=None):
+        url = self.baseurl + uri.Changes
+        if fields:
+            option = options.plan_options(fields, option)
+        params = {
+            'q': query,
+            'n': limit,
+            'o': option
+        }
+        resp = await self.session.get(url, params=params)
+        if ret_type:
+            return [Change(self, item['change_id'], item) for item in resp]
+        return resp
+
+    async def iter_changes(self, query=None, page_size=None, option=None,
+                           ret_type=False, fields=None):
+        url = self.baseurl + uri.Changes
+        if fields:
+            option = options.plan_options(fields, option)
+        params = {
+            'q': query,
+            'o': option
+        }
+        async for item in paginate(self.session, url, params,
+                                   more_key='_more_changes',
+                                   page_size=page_size):
+            yield Change(self, item['change_id'], item) if ret_type else item
+
+    async def map(self, func, change_ids, workers=8):
+        """Async version of Gerrit.map, func returns an awaitable,
+        eg: lambda c: c.revision('current').mergeable()"""
+        def call(change_id):
+            change = change_id if isinstance(change_id, Change) \
+                else self.change(change_id)
+            return func(change)
+
+        return await run_batch(call, change_ids, workers)
+
+    async def create_branches(self, specs, workers=16, progress=None):
+        def create(spec):
+            project, branch, revision = (tuple(spec) + (None,))[:3]
+            return self.project(project).branch(branch).create(revision)
+
+        return await run_batch(create, specs, workers, progress)
+
+    async def create_tags(self, specs, workers=16, progress=None):
+        def create(spec):
+            project, tag, revision, message = (tuple(spec) + (None,) * 2)[:4]
+            return self.project(project).tag(tag).create(revision, message)
+
+        return await run_batch(create, specs, workers, progress)
+
+    async def _remove_refs(self, remove, specs, workers, progress):
+        # delete_branches and delete_tags return this coroutine
+        specs = [tuple(spec) for spec in specs]
+        refs = collections.OrderedDict()
+        for project, name in specs:
+            refs.setdefault(project, []).append(name)
+        results = {}
+
+        def collect(done, total, batch):
+            for result in self._ref_results(batch, refs[batch.item]):
+                results[result.item] = result
+                if progress is not None:
+                    progress(len(results), len(specs), result)
+
+        await run_batch(
+            lambda project: remove(self.project(project), refs[project],
+                                   workers=1),
+            list(refs), workers, collect)
+        return [results[spec] for spec in specs]
+
+    async def download_patches(self, revisions, directory, zip=False,
+                               resume=False, workers=8, progress=None):
+        directory = pathlib.Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+
+        def download(revision):
+            if not isinstance(revision, Revision):
+                revision = self.revision(*revision)
+            name = '%s-%s.%s' % (revision.change.change_id,
+                                 revision.revision_id,
+                                 'zip' if zip else 'patch')
+            name = name.replace('/', '_').replace('~', '_')
+            return revision.download_patch(directory / name, zip, resume)
+
+        return await run_batch(download, revisions, workers, progress)
+
+    async def get_revision(self, commit):
+        changes = await self.changes("commit:%s" % commit, ret_type=True)
+        if len(changes) != 1:
+            err_msgs = ["Found changes with revision[%s] not unique," % commit,
+                        "Please double check your revision."]
+            raise GerritError(' '.join(err_msgs))
+        return changes[0].revision(commit)
+
+    async def projects(self, query='', start=0, limit=None,
+                       ret_type=False):
+        url = self.baseurl + uri.Projects
+        params = {
+            'query': query,
+            'start': start,
+            'limit': limit
+        }
+        resp = await self.session.get(url, params=params)
+        if ret_type:
+            items = helper.page_items(resp, '_more_projects', limit)[0]
+            return [AsyncProject(self, item['name'], item) for item in items]
+        return resp
+
+    async def iter_projects(self, query='', page_size=None, ret_type=False):
+        url = self.baseurl + uri.Projects
+        params = {
+            'query': query
+        }
+        async for item in paginate(self.session, url, params,
+                                   more_key='_more_projects',
+                                   page_size=page_size,
+                                   start_key='start', limit_key='limit'):
+            yield AsyncProject(self, item['name'], item) if ret_type else item
+
+    def project(self, name):
+        return AsyncProject(self, name)
+
+    async def groups(self, query='', start=0, limit=None,
+                     ret_type=False):
+        url = self.baseurl + uri.Groups
+        params = {
+            'query2': query,
+            'start': start,
+            'limit': limit
+        }
+        resp = await self.session.get(url, params=params)
+        if ret_type:
+            items = helper.page_items(resp, '_more_groups', limit)[0]
+            return [AsyncGroup(self, item['group_id'], item) for item in items]
+        return resp
+
+    async def iter_groups(self, query='', page_size=None, ret_type=False):
+        url = self.baseurl + uri.Groups
+        params = {
+            'query2': query
+        }
+        async for item in paginate(self.session, url, params,
+                                   more_key='_more_groups',
+                                   page_size=page_size,
+                                   start_key='start', limit_key='limit'):
+            yield AsyncGroup(self, item['group_id'], item) \
+                if ret_type else item
+
+    def group(self, group_id):
+        return AsyncGroup(self, group_id)
+
+    async def create_group(self, group_name,
+                           description='',
+                           visiable_to_all=True, owner_id=None):
+        data = {
+            "description": description,
+            "visible_to_all": visiable_to_all,
+            "owner_id": owner_id
+        }
+        url = self.baseurl + uri.Group.format(group_id=group_name)
+        resp = await self.session.put(url, json=data)
+        return AsyncGroup(self, resp['group_id'], resp)
+
+    async def accounts(self, query='', limit=None, option=None,
+                       ret_type=False):
+        url = self.baseurl + uri.Accounts
+        params = {
+            'q': query,
+            'n': limit,
+            'o': option
+        }
+        resp = await self.session.get(url, params=params)
+        if ret_type:
+            return [AsyncAccount(self, item['_account_id'], item)
+                    for item in resp]
+        return resp
+
+    async def iter_accounts(self, query='', page_size=None, option=None,
+                            ret_type=False):
+        url = self.baseurl + uri.Accounts
+        params = {
+            'q': query,
+            'o': option
+        }
+        async for item in paginate(self.session, url, params,
+                                   more_key='_more_accounts',
+                                   page_size=page_size):
+            yield AsyncAccount(self, item['_account_id'], item) \
+                if ret_type else item
+
+    def account(self, account_id):
+        return AsyncAccount(self, account_id)
+
+    async def create_account(self, username, **data):
+        url = self.baseurl + uri.Account.format(account_id=username)
+        resp = await self.session.put(url, json=data)
+        return AsyncAccount(self, resp['_account_id'], resp)
+
+    def owner(self):
+        return AsyncAccount(self, 'self')
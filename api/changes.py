@@ -3,22 +3,46 @@
 # @Date    : 2018-04-03 14:42:49
 # @Author  : Shanming Liu
 
-import weakref
+import urllib.parse as urlparse
 
 from .utils import helper
+from .utils import options
 from .utils import uri
 
 
 class Revision(helper.GerritMixin):
     """docstring for Revision"""
 
-    def __init__(self, gerrit, change, revision_id):
+    __slots__ = ('change', 'revision_id')
+
+    # RevisionInfo
+    FIELDS = frozenset([
+        '_number', 'kind', 'created', 'uploader', 'real_uploader', 'ref',
+        'fetch', 'commit', 'branch', 'files', 'actions', 'reviewed',
+        'commit_with_footers', 'push_certificate', 'description',
+        'parents_data'])
+
+    def __init__(self, gerrit, change, revision_id, data=None):
         super().__init__(gerrit,
                          uri.Revision.format(change_id=change.change_id,
-                                             revision_id=revision_id))
-        self.change = weakref.proxy(change)
+                                             revision_id=revision_id),
+                         data)
+        self.change = change
         self.revision_id = revision_id
 
+    def fetch(self):
+        """Revisions have no info endpoint,
+        pick the RevisionInfo from the change."""
+        resp = self.change.info(o='ALL_REVISIONS')
+        if not isinstance(resp, dict):
+            return resp
+        for sha, item in resp.get('revisions', {}).items():
+            if self.revision_id in (sha, str(item.get('_number'))) or \
+                    self.revision_id == 'current' and \
+                    sha == resp.get('current_revision'):
+                return item
+        return {}
+
     def commit(self):
         """Retrieves a parsed commit of a revision."""
         url = self.baseurl + '/commit'
@@ -57,15 +81,23 @@ class Revision(helper.GerritMixin):
         url = self.baseurl + '/related'
         return self.session.get(url)
 
-    def set_review(self, message='', tag=None, labels=None):
+    def set_review(self, message='', tag=None, labels=None,
+                   comments=None, robot_comments=None, **data):
         """Sets a review on a revision.
+        comments and robot_comments map file paths to lists of
+        CommentInput/RobotCommentInput, data holds other ReviewInput
+        fields, eg: notify='NONE'
         https://gerrit-review.googlesource.com/Documentation/rest-api-changes.html#set-review"""
         url = self.baseurl + '/review'
-        data = {
+        data.update({
             'message': message,
             'tag': tag,
             'labels': labels
-        }
+        })
+        if comments:
+            data['comments'] = comments
+        if robot_comments:
+            data['robot_comments'] = robot_comments
 
         return self.session.post(url, json=data)
 
@@ -96,6 +128,27 @@ class Revision(helper.GerritMixin):
         url = self.baseurl + '/patch'
         return self.session.get(url)
 
+    def download_patch(self, dest, zip=False, resume=False):
+        """Stream the formatted patch to dest, a file path or object,
+        decoded from base64, or zipped if zip."""
+        url = self.baseurl + '/patch'
+        if zip:
+            return self.session.download(url + '?zip', dest, resume=resume)
+        return self.session.download(url, dest, base64=True, resume=resume)
+
+    def download_file(self, path, dest, resume=False):
+        """Stream the content of a file of the revision to dest."""
+        url = '%s/files/%s/content' % (self.baseurl,
+                                       urlparse.quote(path, safe=''))
+        return self.session.download(url, dest, base64=True, resume=resume)
+
+    def download_archive(self, dest, format='tgz', resume=False):
+        """Stream an archive of the revision to dest,
+        format is one of tgz, tar, tbz2 or txz."""
+        url = self.baseurl + '/archive'
+        return self.session.download(url, dest, params={'format': format},
+                                     resume=resume)
+
     def mergeable(self, other=False):
         """Gets the method the server will use to submit (merge)
         the change and an indicator if the change is currently mergeable."""
@@ -130,10 +183,39 @@ class Revision(helper.GerritMixin):
 class Change(helper.GerritMixin):
     """docstring for ChangeNew"""
 
-    def __init__(self, gerrit, change_id):
-        super().__init__(gerrit, uri.Change.format(change_id=change_id))
+    __slots__ = ('change_id',)
+
+    # ChangeInfo
+    FIELDS = frozenset([
+        'id', '_number', 'project', 'branch', 'topic', 'attention_set',
+        'removed_from_attention_set', 'hashtags', 'change_id', 'subject',
+        'status', 'created', 'updated', 'submitted', 'submitter', 'starred',
+        'stars', 'reviewed', 'submit_type', 'mergeable', 'submittable',
+        'insertions', 'deletions', 'total_comment_count',
+        'unresolved_comment_count', 'owner', 'actions', 'requirements',
+        'submit_records', 'submit_requirements', 'labels',
+        'permitted_labels', 'removable_labels', 'removable_reviewers',
+        'reviewers', 'pending_reviewers', 'reviewer_updates', 'messages',
+        'current_revision', 'revisions', 'meta_rev_id', 'tracking_ids',
+        'problems', 'is_private', 'work_in_progress', 'has_review_started',
+        'revert_of', 'submission_id', 'cherry_pick_of_change',
+        'cherry_pick_of_patch_set', 'contains_git_conflicts',
+        'assignee', 'base_change'])
+
+    def __init__(self, gerrit, change_id, data=None):
+        super().__init__(gerrit, uri.Change.format(change_id=change_id),
+                         data)
         self.change_id = change_id
 
+    def info(self, fields=None, **params):
+        """Retrieves a change.
+        fields lists the ChangeInfo fields wanted, the minimal set of
+        options returning them is added to the o param,
+        eg: info(fields=['labels', 'current_revision.files'])"""
+        if fields:
+            params['o'] = options.plan_options(fields, params.get('o'))
+        return super().info(**params)
+
     def merge(self, patchSet):
         url = self.baseurl + '/merge'
         return self.session.post(url, data=patchSet)
@@ -234,7 +316,12 @@ class Change(helper.GerritMixin):
 
     def revision(self, revision_id):
         """session.get a revision."""
-        return Revision(self.gerrit, self, revision_id)
+        revisions = self.data.get('revisions', {})
+        if revision_id == 'current':
+            data = revisions.get(self.data.get('current_revision'))
+        else:
+            data = revisions.get(revision_id)
+        return Revision(self.gerrit, self, revision_id, data)
 
     def __repr__(self):
         return '<Change %s>' % self.change_id
@@ -3,7 +3,11 @@
 # @Date    : 2018-04-03 14:42:49
 # @Author  : Shanming Liu
 
+import collections
+import pathlib
+
 from .utils import helper
+from .utils import options
 from .utils import uri
 from .changes import Change, Revision
 from .projects import Project
@@ -16,23 +20,39 @@ class Gerrit(object):
     """docstring for Gerrit"""
 
     def __init__(self, baseurl, username=None,
-                 password=None, level='INFO'):
+                 password=None, level='INFO',
+                 shared_session=False, **session_options):
         """
         :param url: baseurl for gerrit instance including port, str
         :param username: username for Gerrit
         :param password: password or http token for Gerrit
         :param level: log level for logging
+        :param shared_session: reuse the session, and so its warm
+         connections, of other Gerrit objs on the same host and user
+        :param session_options: GerritSession options, eg: pool_maxsize
         :return: a Gerrit obj
         """
         self.baseurl = baseurl.rstrip('/')
         self.username = username
         self.password = password
         self.logger = logger = helper.get_logger('Gerrit', level)
-        self.session = helper.GerritSession(username, password, logger=logger)
+        session_options.setdefault('logger', logger)
+        if shared_session:
+            self.session = helper.GerritSession.shared(
+                self.baseurl, username, password, **session_options)
+        else:
+            self.session = helper.GerritSession(username, password,
+                                                **session_options)
 
     def changes(self, query=None, limit=None, option=None,
-                ret_type=False):
+                ret_type=False, fields=None):
+        """Queries changes visible to the caller.
+        fields lists the ChangeInfo fields wanted, eg: ['labels',
+        'current_revision.files', 'owner.email'], the minimal set of
+        options returning them is added to option."""
         url = self.baseurl + uri.Changes
+        if fields:
+            option = options.plan_options(fields, option)
         params = {
             'q': query,
             'n': limit,
@@ -40,12 +60,78 @@ class Gerrit(object):
         }
         resp = self.session.get(url, params=params)
         if ret_type:
-            return [Change(self, item['change_id']) for item in resp]
+            return [Change(self, item['change_id'], item) for item in resp]
         return resp
 
+    def iter_changes(self, query=None, page_size=None, option=None,
+                     ret_type=False, prefetch=0, stream=False, fields=None):
+        """Iterates over all changes matching the query,
+        following _more_changes page by page.
+        With prefetch, up to that many following pages are fetched
+        in background while the current page is consumed.
+        With stream, each page is parsed while it downloads so that
+        only one ChangeInfo is held in memory.
+        fields is planned into options as for changes()."""
+        url = self.baseurl + uri.Changes
+        if fields:
+            option = options.plan_options(fields, option)
+        params = {
+            'q': query,
+            'o': option
+        }
+        items = helper.paginate(self.session, url, params,
+                                more_key='_more_changes',
+                                page_size=page_size,
+                                prefetch=prefetch, stream=stream)
+        for item in items:
+            yield Change(self, item['change_id'], item) if ret_type else item
+
     def change(self, change_id):
         return Change(self, change_id=change_id)
 
+    def map(self, func, change_ids, workers=8):
+        """
+        Call func with a Change for every change id concurrently,
+        sharing this instance's session.
+        :param func: callable taking a Change,
+         eg: lambda c: c.revision('current').mergeable()
+        :param change_ids: change ids or Change objects
+        :param workers: max number of calls in flight
+        :return: list of helper.BatchResult in input order, a failed call
+         keeps its GerritError in error instead of aborting the batch
+        """
+        def call(change_id):
+            change = change_id if isinstance(change_id, Change) \
+                else self.change(change_id)
+            return func(change)
+
+        return helper.run_batch(call, change_ids, workers)
+
+    def download_patches(self, revisions, directory, zip=False,
+                         resume=False, workers=8, progress=None):
+        """
+        Download the patches of many revisions concurrently,
+        to <directory>/<change_id>-<revision_id>.patch
+        :param revisions: Revision objects or (change_id, revision_id)
+        :param zip: download zipped patches, to .zip files
+        :param resume: skip the patches already downloaded
+        :return: list of helper.BatchResult in input order,
+         with the path of the patch as result
+        """
+        directory = pathlib.Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+
+        def download(revision):
+            if not isinstance(revision, Revision):
+                revision = self.revision(*revision)
+            name = '%s-%s.%s' % (revision.change.change_id,
+                                 revision.revision_id,
+                                 'zip' if zip else 'patch')
+            name = name.replace('/', '_').replace('~', '_')
+            return revision.download_patch(directory / name, zip, resume)
+
+        return helper.run_batch(download, revisions, workers, progress)
+
     def revision(self, change_id, revision_id):
         return Revision(self, Change(self, change_id), revision_id)
 
@@ -67,12 +153,100 @@ class Gerrit(object):
         }
         resp = self.session.get(url, params=params)
         if ret_type:
-            return [Project(self, name) for name in resp]
+            items = helper.page_items(resp, '_more_projects', limit)[0]
+            return [Project(self, item['name'], item) for item in items]
         return resp
 
+    def iter_projects(self, query='', page_size=None, ret_type=False,
+                      prefetch=0, stream=False):
+        """Iterates over all projects visible to the caller."""
+        url = self.baseurl + uri.Projects
+        params = {
+            'query': query
+        }
+        items = helper.paginate(self.session, url, params,
+                                more_key='_more_projects',
+                                page_size=page_size,
+                                start_key='start', limit_key='limit',
+                                prefetch=prefetch, stream=stream)
+        for item in items:
+            yield Project(self, item['name'], item) if ret_type else item
+
     def project(self, name):
         return Project(self, name)
 
+    def create_branches(self, specs, workers=16, progress=None):
+        """
+        Creates branches across projects in parallel.
+        :param specs: (project, branch) or (project, branch, revision)
+        :param progress: optional callable(done, total, result)
+        :return: list of helper.BatchResult in input order
+        """
+        def create(spec):
+            project, branch, revision = (tuple(spec) + (None,))[:3]
+            return self.project(project).branch(branch).create(revision)
+
+        return helper.run_batch(create, specs, workers, progress)
+
+    def delete_branches(self, specs, workers=16, progress=None):
+        """
+        Deletes branches across projects, with one batch request per
+        project, see Project.remove_branches.
+        :param specs: (project, branch) pairs
+        :return: list of helper.BatchResult in input order
+        """
+        return self._remove_refs(Project.remove_branches, specs,
+                                 workers, progress)
+
+    def create_tags(self, specs, workers=16, progress=None):
+        """
+        Creates tags across projects in parallel.
+        :param specs: (project, tag), (project, tag, revision)
+         or (project, tag, revision, message)
+        :return: list of helper.BatchResult in input order
+        """
+        def create(spec):
+            project, tag, revision, message = (tuple(spec) + (None,) * 2)[:4]
+            return self.project(project).tag(tag).create(revision, message)
+
+        return helper.run_batch(create, specs, workers, progress)
+
+    def delete_tags(self, specs, workers=16, progress=None):
+        """
+        Deletes tags across projects, with one batch request per project,
+        see Project.remove_tags.
+        :param specs: (project, tag) pairs
+        :return: list of helper.BatchResult in input order
+        """
+        return self._remove_refs(Project.remove_tags, specs,
+                                 workers, progress)
+
+    def _remove_refs(self, remove, specs, workers, progress):
+        specs = [tuple(spec) for spec in specs]
+        refs = collections.OrderedDict()
+        for project, name in specs:
+            refs.setdefault(project, []).append(name)
+        results = {}
+        batches = helper.iter_batch(
+            lambda project: remove(self.project(project), refs[project],
+                                   workers=1),
+            list(refs), workers)
+        for _, batch in batches:
+            for result in self._ref_results(batch, refs[batch.item]):
+                results[result.item] = result
+                if progress is not None:
+                    progress(len(results), len(specs), result)
+        return [results[spec] for spec in specs]
+
+    @staticmethod
+    def _ref_results(batch, names):
+        # results per (project, ref) of the removal of names in a project
+        results = batch.result or [
+            helper.BatchResult(name, None, batch.error, batch.elapsed)
+            for name in names]
+        return [result._replace(item=(batch.item, result.item))
+                for result in results]
+
     def version(self):
         url = self.baseurl + uri.ServerVersion
         return self.session.get(url)
@@ -86,20 +260,38 @@ class Gerrit(object):
         return self.session.get(url)
 
     def groups(self, query='', start=0, limit=None,
-               ret_type=False):
+               ret_type=False, option=None):
         """Lists the groups accessible by the caller."""
         url = self.baseurl + uri.Groups
         params = {
             'query2': query,
             'start': start,
-            'limit': limit
+            'limit': limit,
+            'o': option
         }
 
         resp = self.session.get(url, params=params)
         if ret_type:
-            return [Group(self, item['group_id']) for item in resp]
+            items = helper.page_items(resp, '_more_groups', limit)[0]
+            return [Group(self, item['group_id'], item) for item in items]
         return resp
 
+    def iter_groups(self, query='', page_size=None, ret_type=False,
+                    prefetch=0, stream=False, option=None):
+        """Iterates over all groups accessible by the caller."""
+        url = self.baseurl + uri.Groups
+        params = {
+            'query2': query,
+            'o': option
+        }
+        items = helper.paginate(self.session, url, params,
+                                more_key='_more_groups',
+                                page_size=page_size,
+                                start_key='start', limit_key='limit',
+                                prefetch=prefetch, stream=stream)
+        for item in items:
+            yield Group(self, item['group_id'], item) if ret_type else item
+
     def group(self, group_id):
         return Group(self, group_id)
 
@@ -114,7 +306,7 @@ class Gerrit(object):
         }
         url = self.baseurl + uri.Group.format(group_id=group_name)
         resp = self.session.put(url, json=data)
-        return Group(self, resp['group_id'])
+        return Group(self, resp['group_id'], resp)
 
     def accounts(self, query='', limit=None, option=None,
                  ret_type=False):
@@ -128,16 +320,34 @@ class Gerrit(object):
 
         resp = self.session.get(url, params=params)
         if ret_type:
-            return [Account(self, item['_account_id']) for item in resp]
+            return [Account(self, item['_account_id'], item)
+                    for item in resp]
         return resp
 
+    def iter_accounts(self, query='', page_size=None, option=None,
+                      ret_type=False, prefetch=0, stream=False):
+        """Iterates over all accounts matching the query,
+        following _more_accounts page by page."""
+        url = self.baseurl + uri.Accounts
+        params = {
+            'q': query,
+            'o': option
+        }
+        items = helper.paginate(self.session, url, params,
+                                more_key='_more_accounts',
+                                page_size=page_size,
+                                prefetch=prefetch, stream=stream)
+        for item in items:
+            yield Account(self, item['_account_id'], item) \
+                if ret_type else item
+
     def account(self, account_id):
         return Account(self, account_id)
 
     def create_account(self, username, **data):
         url = self.baseurl + uri.Account.format(account_id=username)
         resp = self.session.put(url, json=data)
-        return Account(self, resp['_account_id'])
+        return Account(self, resp['_account_id'], resp)
 
     def owner(self):
         return Account(self, 'self')
@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Date    : 2026-10-17 14:41:26
+# @Author  : Shanming Liu
+
+import collections
+
+from .utils import helper
+
+
+class GroupGraph(object):
+    """
+    Client side graph of nested groups, built from Group.detail().
+    Each group is fetched once however many parents include it, the
+    groups of one nesting level are fetched in parallel, and recursive
+    questions are then answered from memory.
+    :Example:
+        >>> graph = GroupGraph(gerrit)
+        >>> graph.accounts_of('Administrators')
+        >>> graph.groups_containing(1000096)
+    """
+
+    def __init__(self, gerrit, workers=8):
+        """
+        :param gerrit: Gerrit instance used to fetch the groups
+        :param workers: max number of groups fetched at the same time
+        """
+        self.gerrit = gerrit
+        self.workers = workers
+        self.members = {}
+        self.subgroups = {}
+        self.parents = collections.defaultdict(set)
+        self.accounts = {}
+        self.names = {}
+        self.errors = {}
+        self._closures = {}
+
+    def uuid(self, key):
+        """UUID of a group given by UUID, id or name."""
+        return self.names.get(str(key), key)
+
+    def expand(self, *keys):
+        """
+        Fetch the groups and all their nested subgroups not fetched yet,
+        level by level. A group which can not be read, eg: an external
+        group, is kept as a leaf and its error stored in errors.
+        """
+        level = {self.uuid(key) for key in keys} - set(self.subgroups)
+        while level:
+            results = helper.run_batch(
+                lambda key: self.gerrit.group(key).detail(),
+                sorted(level), self.workers)
+            level = set()
+            for result in results:
+                level.update(self.add(result.item, result.result,
+                                      result.error))
+            level -= set(self.subgroups)
+        return self
+
+    def add(self, key, info, error=None):
+        """Record one GroupInfo with members and includes,
+        return the UUIDs of its subgroups."""
+        if error is not None:
+            self.errors[key] = error
+            self.members[key], self.subgroups[key] = set(), []
+            return []
+        uuid = info['id']
+        for alias in (key, info.get('group_id'), info.get('name')):
+            if alias is not None and str(alias) != uuid:
+                self.names[str(alias)] = uuid
+        members = info.get('members', [])
+        includes = info.get('includes', [])
+        self.accounts.update((item['_account_id'], item) for item in members)
+        self.members[uuid] = {item['_account_id'] for item in members}
+        self.subgroups[uuid] = [item['id'] for item in includes]
+        for subgroup in self.subgroups[uuid]:
+            self.parents[subgroup].add(uuid)
+        return self.subgroups[uuid]
+
+    def descendants(self, key):
+        """UUIDs of the group and all its nested subgroups."""
+        uuid = self.uuid(key)
+        self.expand(uuid)
+        seen, queue = {uuid}, collections.deque([uuid])
+        while queue:
+            for subgroup in self.subgroups.get(queue.popleft(), ()):
+                if subgroup not in seen:
+                    seen.add(subgroup)
+                    queue.append(subgroup)
+        return seen
+
+    def accounts_of(self, key):
+        """Account ids of all direct and nested members of a group."""
+        uuid = self.uuid(key)
+        if uuid not in self._closures:
+            accounts = set()
+            for group in self.descendants(uuid):
+                accounts |= self.members.get(group, set())
+            self._closures[uuid] = frozenset(accounts)
+        return self._closures[uuid]
+
+    def groups_containing(self, account_id):
+        """UUIDs of the expanded groups an account belongs to,
+        directly or through nested groups."""
+        found = {uuid for uuid, members in self.members.items()
+                 if account_id in members}
+        queue = collections.deque(found)
+        while queue:
+            for parent in self.parents.get(queue.popleft(), ()):
+                if parent not in found:
+                    found.add(parent)
+                    queue.append(parent)
+        return found
+
+    def cycles(self):
+        """Return the (group, subgroup) edges closing an inclusion cycle."""
+        edges, state = [], {}
+        for root in self.subgroups:
+            if root in state:
+                continue
+            state[root] = 'open'
+            stack = [(root, iter(self.subgroups[root]))]
+            while stack:
+                group, children = stack[-1]
+                for child in children:
+                    if state.get(child) == 'open':
+                        edges.append((group, child))
+                    elif child not in state:
+                        state[child] = 'open'
+                        stack.append((child,
+                                      iter(self.subgroups.get(child, ()))))
+                        break
+                else:
+                    state[group] = 'done'
+                    stack.pop()
+        return edges
+
+    def clear(self):
+        """Forget everything fetched so far."""
+        for mapping in (self.members, self.subgroups, self.parents,
+                        self.accounts, self.names, self.errors,
+                        self._closures):
+            mapping.clear()
@@ -9,8 +9,15 @@ from .accounts import Account
 
 
 class Group(helper.GerritMixin):
-    def __init__(self, gerrit, group_id):
-        super().__init__(gerrit, uri.Group.format(group_id=group_id))
+    __slots__ = ('group_id',)
+
+    # GroupInfo
+    FIELDS = frozenset([
+        'id', 'name', 'url', 'options', 'description', 'group_id', 'owner',
+        'owner_id', 'created_on', 'members', 'includes'])
+
+    def __init__(self, gerrit, group_id, data=None):
+        super().__init__(gerrit, uri.Group.format(group_id=group_id), data)
         self.group_id = group_id
 
     def detail(self):
@@ -80,10 +87,21 @@ class Group(helper.GerritMixin):
             url += '?recursive'
         resp = self.session.get(url)
         if ret_type:
-            account_ids = sorted(map(lambda x: x['_account_id'], resp))
-            return [Account(self.gerrit, _id) for _id in account_ids]
+            resp = sorted(resp, key=lambda x: x['_account_id'])
+            return [Account(self.gerrit, item['_account_id'], item)
+                    for item in resp]
         return resp
 
+    def iter_members(self, recursive=False, ret_type=False):
+        """Lists the members of a Gerrit internal group,
+        parsing the response while it downloads."""
+        url = self.baseurl + '/members'
+        if recursive:
+            url += '?recursive'
+        for item in self.session.iter_items(url):
+            yield Account(self.gerrit, item['_account_id'], item) \
+                if ret_type else item
+
     def account(self, account_id):
         """Retrieves a group member."""
         return Account(self.gerrit, account_id)
@@ -109,7 +127,7 @@ class Group(helper.GerritMixin):
         """Lists the direct subgroups of a group."""
         url = self.baseurl + '/groups/'
         resp = self.session.get(url)
-        return [Group(self.gerrit, item['group_id']) for item in resp]
+        return [Group(self.gerrit, item['group_id'], item) for item in resp]
 
     def __repr__(self):
         return '<Group %s>' % self.group_id
@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Date    : 2026-10-17 14:05:52
+# @Author  : Shanming Liu
+
+import collections
+import threading
+
+
+class AccountIndex(object):
+    """
+    In-process index of accounts and groups, resolving ids, usernames,
+    emails, names and group memberships with dict lookups.
+    :Example:
+        >>> index = AccountIndex(gerrit)
+        >>> index.load()
+        >>> ids = [index.account_id(name) for name in reviewers]
+    """
+
+    ACCOUNT_OPTIONS = ['DETAILS', 'ALL_EMAILS']
+
+    def __init__(self, gerrit, page_size=500, prefetch=2):
+        """
+        :param gerrit: Gerrit instance used to load the index
+        :param page_size: accounts or groups requested per page
+        :param prefetch: pages fetched in background while loading
+        """
+        self.gerrit = gerrit
+        self.page_size = page_size
+        self.prefetch = prefetch
+        self.accounts = {}
+        self.by_username = {}
+        self.by_email = {}
+        self.by_name = collections.defaultdict(set)
+        self.groups = {}
+        self.group_keys = {}
+        self.members = collections.defaultdict(set)
+        self.memberships = collections.defaultdict(set)
+        self._lock = threading.RLock()
+
+    def load(self, query='is:active', groups=True):
+        """
+        Bulk load the accounts matching query, and all visible groups
+        with their direct members if groups.
+        Entries are updated in place, loading again refreshes them.
+        """
+        accounts = self.gerrit.iter_accounts(query,
+                                             page_size=self.page_size,
+                                             option=self.ACCOUNT_OPTIONS,
+                                             prefetch=self.prefetch)
+        for info in accounts:
+            self.add_account(info)
+        if groups:
+            self.load_groups()
+        return self
+
+    def load_groups(self, query=''):
+        """Load the groups matching query with their direct members."""
+        groups = self.gerrit.iter_groups(query, page_size=self.page_size,
+                                         option='MEMBERS',
+                                         prefetch=self.prefetch)
+        for info in groups:
+            self.add_group(info)
+        return self
+
+    def add_account(self, info):
+        """Index or update one AccountInfo."""
+        with self._lock:
+            account_id = info['_account_id']
+            old = self.accounts.get(account_id)
+            if old is not None:
+                info = dict(old, **info)
+                self._unlink_account(old)
+            self.accounts[account_id] = info
+            if info.get('username'):
+                self.by_username[info['username']] = account_id
+            emails = [info.get('email')] + info.get('secondary_emails', [])
+            for email in filter(None, emails):
+                self.by_email[email.lower()] = account_id
+            if info.get('name'):
+                self.by_name[info['name']].add(account_id)
+        return info
+
+    def _unlink_account(self, info):
+        account_id = info['_account_id']
+        if self.by_username.get(info.get('username')) == account_id:
+            del self.by_username[info['username']]
+        emails = [info.get('email')] + info.get('secondary_emails', [])
+        for email in filter(None, emails):
+            if self.by_email.get(email.lower()) == account_id:
+                del self.by_email[email.lower()]
+        self.by_name.get(info.get('name'), set()).discard(account_id)
+
+    def remove_account(self, account_id):
+        with self._lock:
+            info = self.accounts.pop(account_id, None)
+            if info is not None:
+                self._unlink_account(info)
+            for group_id in self.memberships.pop(account_id, ()):
+                self.members[group_id].discard(account_id)
+
+    def add_group(self, info):
+        """Index or update one GroupInfo, and its members if listed."""
+        with self._lock:
+            group_id = info['id']
+            self.groups[group_id] = dict(self.groups.get(group_id, {}),
+                                         **info)
+            for key in (info.get('group_id'), info.get('name')):
+                if key is not None:
+                    self.group_keys[str(key)] = group_id
+            if 'members' in info:
+                self.set_members(group_id, info['members'])
+        return info
+
+    def set_members(self, group_id, members):
+        """Replace the direct members of a group by the AccountInfo list."""
+        with self._lock:
+            for account_id in self.members.pop(group_id, ()):
+                self.memberships[account_id].discard(group_id)
+            for member in members:
+                self.add_account(member)
+                self.members[group_id].add(member['_account_id'])
+                self.memberships[member['_account_id']].add(group_id)
+
+    def refresh_account(self, key):
+        """Fetch one account again, by any key the server accepts."""
+        info = self.gerrit.account(key).details()
+        return self.add_account(info)
+
+    def refresh_group(self, key):
+        """Fetch one group and its direct members again."""
+        group = self.gerrit.group(self.group_keys.get(str(key), key))
+        info = group.detail()
+        return self.add_group(info)
+
+    def resolve(self, key, fetch=False):
+        """
+        Find the AccountInfo of an account id, username, email or
+        full name, None if unknown.
+        :param fetch: ask the server on a miss and index the result
+        """
+        account_id = self.lookup(key)
+        if account_id is None and fetch:
+            matches = self.gerrit.accounts(str(key), limit=2,
+                                           option=self.ACCOUNT_OPTIONS)
+            if len(matches) == 1:
+                account_id = self.add_account(matches[0])['_account_id']
+        return self.accounts.get(account_id)
+
+    def lookup(self, key):
+        """Local only resolution of key to an account id."""
+        if isinstance(key, int) or str(key).isdigit():
+            account_id = int(key)
+            return account_id if account_id in self.accounts else None
+        if key in self.by_username:
+            return self.by_username[key]
+        if '@' in key and key.lower() in self.by_email:
+            return self.by_email[key.lower()]
+        ids = self.by_name.get(key)
+        if ids and len(ids) == 1:
+            return next(iter(ids))
+        return None
+
+    def account_id(self, key, fetch=False):
+        info = self.resolve(key, fetch)
+        return info['_account_id'] if info else None
+
+    def group(self, key):
+        """GroupInfo of a group UUID, id or name, None if unknown."""
+        return self.groups.get(self.group_keys.get(str(key), key))
+
+    def members_of(self, key):
+        """Account ids of the direct members of a group."""
+        group = self.group(key)
+        return set(self.members.get(group['id'], ())) if group else set()
+
+    def groups_of(self, key):
+        """UUIDs of the groups an account is a direct member of."""
+        account_id = self.lookup(key)
+        return set(self.memberships.get(account_id, ()))
+
+    def __len__(self):
+        return len(self.accounts)
@@ -3,23 +3,33 @@
 # @Date    : 2018-04-03 14:42:49
 # @Author  : Shanming Liu
 
-import weakref
+import time
+import urllib.parse as urlparse
 
 from .utils import uri
 from .utils import helper
+from .utils.exceptions import GerritError
 
 
 class Branch(helper.GerritMixin):
-    def __init__(self, gerrit, project, branch_name=None):
-        if 'refs/' in branch_name:
-            self.ref = branch_name
-            branch_name = branch_name.split('/')[-1]
+    __slots__ = ('project', 'branch_name', 'ref')
+
+    # BranchInfo
+    FIELDS = frozenset(['ref', 'revision', 'can_delete', 'web_links'])
+
+    def __init__(self, gerrit, project, branch_name=None, data=None):
+        # branch names may hold slashes, eg: release/1.0 or refs/meta/config
+        if branch_name.startswith('refs/'):
+            ref = branch_name
+            if branch_name.startswith('refs/heads/'):
+                branch_name = branch_name[len('refs/heads/'):]
         else:
-            self.ref = 'refs/heads/{}'.format(branch_name)
+            ref = 'refs/heads/{}'.format(branch_name)
         super().__init__(gerrit, uri.Branch.format(
             project_name=project.project_name,
-            branch_name=branch_name))
-        self.project = weakref.proxy(project)
+            branch_name=urlparse.quote(branch_name, safe='')), data)
+        self.ref = ref
+        self.project = project
         self.branch_name = branch_name
 
     def create(self, revision=None):
@@ -53,18 +63,24 @@ class Branch(helper.GerritMixin):
 class Tag(helper.GerritMixin):
     """docstring for Tag"""
 
-    def __init__(self, gerrit, project, tag_id):
-        if 'refs/' in tag_id:
-            tag_id = tag_id.split('/')[-1]
-        super().__init__(gerrit,
-                         uri.Tag.format(project_name=project.project_name,
-                                        tag_id=tag_id))
-        self.project = weakref.proxy(project)
+    __slots__ = ('project', 'tag_id')
+
+    # TagInfo
+    FIELDS = frozenset(['ref', 'revision', 'object', 'message', 'tagger',
+                        'created', 'can_delete', 'web_links'])
+
+    def __init__(self, gerrit, project, tag_id, data=None):
+        if tag_id.startswith('refs/tags/'):
+            tag_id = tag_id[len('refs/tags/'):]
+        super().__init__(gerrit, uri.Tag.format(
+            project_name=project.project_name,
+            tag_id=urlparse.quote(tag_id, safe='')), data)
+        self.project = project
         self.tag_id = tag_id
 
     def create(self, revision=None, message=None):
         data = {
-            "revision": revision if not revision else 'HEAD'
+            "revision": revision if revision else 'HEAD'
         }
         if message:
             data['message'] = message
@@ -80,11 +96,19 @@ class Tag(helper.GerritMixin):
 class Project(helper.GerritMixin):
     """This page describes the project related REST endpoints."""
 
-    def __init__(self, gerrit, name):
+    __slots__ = ('project_name',)
+
+    # ProjectInfo
+    FIELDS = frozenset(['id', 'name', 'parent', 'description', 'state',
+                        'branches', 'labels', 'web_links',
+                        'config_web_links'])
+
+    def __init__(self, gerrit, name, data=None):
         if '/' in name:
             name = name.replace('/', '%2F')
         super(Project, self).__init__(gerrit,
-                                      uri.Project.format(project_name=name))
+                                      uri.Project.format(project_name=name),
+                                      data)
         self.project_name = name
 
     def create(self, data):
@@ -121,7 +145,15 @@ class Project(helper.GerritMixin):
         """List the branches of a project."""
         url = self.baseurl + '/branches'
         resp = self.session.get(url, params=params)
-        return [Branch(self.gerrit, self, branch['ref']) for branch in resp]
+        return [Branch(self.gerrit, self, branch['ref'], branch)
+                for branch in resp]
+
+    def iter_branches(self, **params):
+        """List the branches of a project,
+        parsing the response while it downloads."""
+        url = self.baseurl + '/branches'
+        for branch in self.session.iter_items(url, params=params):
+            yield Branch(self.gerrit, self, branch['ref'], branch)
 
     def create_branch(self, branch_name, revision=None):
         """Creates a new branch.
@@ -130,15 +162,76 @@ class Project(helper.GerritMixin):
         branch.create(revision)
         return branch
 
-    def delete_branchs(self, *branchs):
+    def create_branches(self, branches, revision=None,
+                        workers=8, progress=None):
+        """Creates branches in parallel.
+        :param branches: branch names or (name, revision) pairs
+        :param revision: base revision of the names given alone,
+         HEAD if not set
+        :param progress: optional callable(done, total, result)
+        :return: list of helper.BatchResult in input order"""
+        def create(branch):
+            name, base = branch if isinstance(branch, tuple) \
+                else (branch, revision)
+            return self.branch(name).create(base)
+
+        return helper.run_batch(create, branches, workers, progress)
+
+    def delete_branches(self, *branches):
         """Delete one or more branches.
         https://gerrit-review.googlesource.com/Documentation/rest-api-projects.html#delete-branches"""
-        url = self.baseurl + ':delete'
+        url = self.baseurl + '/branches:delete'
         data = {
-            'branchs': branchs
+            'branches': branches
         }
         return self.session.post(url, json=data)
 
+    delete_branchs = delete_branches
+
+    def remove_branches(self, branches, workers=8, progress=None):
+        """Deletes branches with one batch request, falling back to
+        parallel per-branch deletes if the batch fails.
+        :return: list of helper.BatchResult in input order, elapsed is
+         the time of the whole batch request when it succeeds"""
+        return self._remove_refs(self.delete_branches, self.branch,
+                                 branches, workers, progress)
+
+    def _remove_refs(self, batch_delete, ref, names, workers, progress):
+        names = list(names)
+        start = time.perf_counter()
+        try:
+            batch_delete(*names)
+        except GerritError:
+            self.logger.warning('Batch delete failed on %s, '
+                                'deleting refs one by one', self)
+        else:
+            return self._removed(names, time.perf_counter() - start,
+                                 progress)
+
+        def delete(name):
+            target = ref(name)
+            try:
+                return target.delete()
+            except GerritError as e:
+                try:
+                    target.info()
+                except GerritError:
+                    # already gone, deleted by the failed batch
+                    return None
+                raise e
+
+        return helper.run_batch(delete, names, workers, progress)
+
+    @staticmethod
+    def _removed(names, elapsed, progress):
+        # results of the refs deleted by one batch request
+        results = [helper.BatchResult(name, None, None, elapsed)
+                   for name in names]
+        for done, result in enumerate(results, 1):
+            if progress is not None:
+                progress(done, len(results), result)
+        return results
+
     def branch(self, branch_name):
         return Branch(self.gerrit, self, branch_name)
 
@@ -146,25 +239,47 @@ class Project(helper.GerritMixin):
         """List the direct child projects of a project."""
         url = self.baseurl + '/children'
         resp = self.session.get(url)
-        return [Project(self.gerrit, item['id']) for item in resp]
+        return [Project(self.gerrit, item['id'], item) for item in resp]
 
     def tags(self, **params):
         """List the tags of a project."""
         url = self.baseurl + '/tags'
         resp = self.session.get(url, params=params)
-        return [Tag(self.gerrit, self, item['ref']) for item in resp]
+        return [Tag(self.gerrit, self, item['ref'], item) for item in resp]
 
     def tag(self, tag_id):
         """Retrieves a tag of a project."""
         return Tag(self.gerrit, self, tag_id)
 
+    def create_tags(self, tags, revision=None, message=None,
+                    workers=8, progress=None):
+        """Creates tags in parallel.
+        :param tags: tag names or (name, revision) pairs
+        :param revision: revision of the names given alone,
+         HEAD if not set
+        :param message: annotation message, lightweight tags if not set
+        :param progress: optional callable(done, total, result)
+        :return: list of helper.BatchResult in input order"""
+        def create(tag):
+            name, base = tag if isinstance(tag, tuple) else (tag, revision)
+            return self.tag(name).create(base, message)
+
+        return helper.run_batch(create, tags, workers, progress)
+
     def delete_tags(self, *tags):
         """Delete one or more tags."""
-        url = self.baseurl + '/tags'
+        url = self.baseurl + '/tags:delete'
         data = {
             'tags': tags
         }
-        self.session.post(url, json=data)
+        return self.session.post(url, json=data)
+
+    def remove_tags(self, tags, workers=8, progress=None):
+        """Deletes tags with one batch request, falling back to
+        parallel per-tag deletes if the batch fails.
+        :return: list of helper.BatchResult in input order"""
+        return self._remove_refs(self.delete_tags, self.tag,
+                                 tags, workers, progress)
 
     def __repr__(self):
         return '<Project %s>' % self.project_name
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Date    : 2026-10-17 16:31:48
+# @Author  : Shanming Liu
+
+import collections
+import threading
+
+from .utils import helper
+
+
+class ReviewBatcher(object):
+    """
+    Queue of reviews merged per revision and posted in batches.
+    Reviews queued for the same revision become one ReviewInput: labels
+    are updated, the last vote wins, messages are joined, comments and
+    robot comments are concatenated per file. Pending reviews are posted
+    concurrently when max_pending revisions are queued, every
+    flush_interval seconds or on flush().
+    :Example:
+        >>> with ReviewBatcher(gerrit, flush_interval=5,
+        >>>                    on_result=report) as batcher:
+        >>>     batcher.add(12345, labels={'Verified': 1})
+        >>>     batcher.add(12345, robot_comments={'a.py': [comment]})
+    """
+
+    def __init__(self, gerrit, max_pending=100, flush_interval=None,
+                 workers=8, on_result=None, max_results=1000):
+        """
+        :param gerrit: Gerrit instance posting the reviews
+        :param max_pending: revisions queued before a flush
+        :param flush_interval: seconds before pending reviews are flushed
+         from a background timer, only on size or on demand if None
+        :param workers: max number of reviews posted at the same time
+        :param on_result: callable(helper.BatchResult) called for each
+         posted review, whose item is (change_id, revision_id), its
+         exceptions are logged
+        :param max_results: results of the latest reviews kept in results
+        """
+        self.gerrit = gerrit
+        self.max_pending = max_pending
+        self.flush_interval = flush_interval
+        self.workers = workers
+        self.on_result = on_result
+        # results of the latest flushes, bounded for long running bots
+        self.results = collections.deque(maxlen=max_results)
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._timer = None
+
+    def add(self, change_id, revision_id='current', message=None,
+            labels=None, comments=None, robot_comments=None, **data):
+        """Queue a review of a revision, see Revision.set_review."""
+        with self._lock:
+            review = self._pending.setdefault((change_id, revision_id), {})
+            if message:
+                messages = review.setdefault('messages', [])
+                messages.append(message)
+            if labels:
+                review.setdefault('labels', {}).update(labels)
+            for key, value in (('comments', comments),
+                               ('robot_comments', robot_comments)):
+                for path, items in (value or {}).items():
+                    review.setdefault(key, {}).setdefault(path, []) \
+                        .extend(items)
+            review.update(data)
+            full = len(self._pending) >= self.max_pending
+            if not full and self.flush_interval is not None and \
+                    self._timer is None:
+                self._timer = threading.Timer(self.flush_interval,
+                                              self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        if full:
+            self.flush()
+
+    def __len__(self):
+        return len(self._pending)
+
+    def _post(self, key, review):
+        change_id, revision_id = key
+        review = dict(review)
+        review['message'] = '\n\n'.join(review.pop('messages', []))
+        return self.gerrit.revision(change_id, revision_id) \
+            .set_review(**review)
+
+    def flush(self):
+        """
+        Post the pending reviews.
+        :return: list of helper.BatchResult, one per revision
+        """
+        # flushes run one after the other, keeping the order of the
+        # reviews posted on one revision
+        with self._flush_lock:
+            with self._lock:
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return []
+            results = helper.run_batch(
+                lambda key: self._post(key, pending[key]), list(pending),
+                self.workers)
+        self.results.extend(results)
+        if self.on_result is not None:
+            for result in results:
+                try:
+                    self.on_result(result)
+                except Exception:
+                    # raised in the timer thread it would be lost
+                    self.gerrit.logger.exception(
+                        'on_result failed on the review of %s %s',
+                        *result.item)
+        return results
+
+    def close(self):
+        """Flush the pending reviews and stop the timer."""
+        return self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
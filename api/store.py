@@ -0,0 +1,328 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Date    : 2026-10-17 15:58:12
+# @Author  : Shanming Liu
+
+"""SQLite mirror of ChangeInfo answering common search operators locally.
+
+https://gerrit-review.googlesource.com/Documentation/user-search.html
+"""
+
+import json
+import re
+import shlex
+import sqlite3
+import threading
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS changes (
+    number INTEGER PRIMARY KEY, change_id TEXT, project TEXT, branch TEXT,
+    topic TEXT, status TEXT, subject TEXT, owner INTEGER, owner_name TEXT,
+    owner_email TEXT, owner_username TEXT, created TEXT, updated TEXT,
+    current_revision TEXT, data TEXT);
+CREATE TABLE IF NOT EXISTS revisions (
+    number INTEGER, revision TEXT, patch_set INTEGER, ref TEXT,
+    created TEXT, uploader INTEGER, PRIMARY KEY (number, revision));
+CREATE TABLE IF NOT EXISTS files (
+    number INTEGER, path TEXT, status TEXT, lines_inserted INTEGER,
+    lines_deleted INTEGER, PRIMARY KEY (number, path));
+CREATE TABLE IF NOT EXISTS votes (
+    number INTEGER, label TEXT, account INTEGER, value INTEGER, state TEXT);
+CREATE INDEX IF NOT EXISTS changes_project ON changes (project, branch);
+CREATE INDEX IF NOT EXISTS changes_owner ON changes (owner);
+CREATE INDEX IF NOT EXISTS changes_status ON changes (status, updated);
+CREATE INDEX IF NOT EXISTS files_path ON files (path);
+CREATE INDEX IF NOT EXISTS votes_label ON votes (label, value, number);
+CREATE INDEX IF NOT EXISTS votes_state ON votes (label, state, number);
+CREATE INDEX IF NOT EXISTS votes_number ON votes (number);
+"""
+
+# user_version of the SQLite files written by ChangeStore
+SCHEMA_VERSION = 1
+
+TABLES = ('changes', 'revisions', 'files', 'votes')
+
+# label summaries of LABELS, sent without the vote values when the
+# labels are not detailed
+LABEL_STATES = ('approved', 'recommended', 'disliked', 'rejected')
+
+# label:X=MAX and label:X=MIN search the votes of the label range ends
+LABEL_ALIASES = {
+    'max': 'approved',
+    'min': 'rejected'
+}
+
+STATUSES = {
+    'open': ('NEW',),
+    'pending': ('NEW',),
+    'new': ('NEW',),
+    'closed': ('MERGED', 'ABANDONED'),
+    'merged': ('MERGED',),
+    'abandoned': ('ABANDONED',)
+}
+
+LABEL_PATTERN = re.compile(r'^(?P<label>[\w-]+?)(?P<op>>=|<=|=|>|<)?'
+                           r'(?P<value>[+-]?\d+)$')
+
+DATE_PATTERN = re.compile(r'^\d{4}-\d{2}-\d{2}')
+
+LABEL_STATE_PATTERN = re.compile(r'^(?P<label>[\w-]+)=(?P<state>[A-Za-z]+)$')
+
+
+def label_state(value, values):
+    """Summary state of a vote value given the values of the label."""
+    if not value or not values:
+        return None
+    values = [int(key) for key in values]
+    if value > 0:
+        return 'approved' if value >= max(values) else 'recommended'
+    return 'rejected' if value <= min(values) else 'disliked'
+
+
+def _regexp(pattern, value):
+    return value is not None and re.search(pattern, value) is not None
+
+
+class ChangeStore(object):
+    """
+    Local indexed copy of changes, loaded from query results and
+    searched with a subset of the Gerrit query language: project:,
+    projects:, branch:, topic:, owner:, status:, is:, file:, label:,
+    change:, after:, before:, plain terms AND-ed, negated by - or NOT.
+    Load the changes with OPTIONS to get labels, votes and files.
+    label:X+N and the other numeric label searches only match the votes
+    loaded with DETAILED_LABELS, the labels of changes loaded without
+    it only tell the state of the label, searched with
+    label:X=approved, recommended, disliked, rejected, MAX or MIN.
+    file:name matches a path or some of its components, eg: file:a.py
+    matches src/a.py, file:^regex matches the regex against the paths.
+    Searches the store can not answer, eg: owner:self or after:1d,
+    raise ValueError.
+    :Example:
+        >>> store = ChangeStore('changes.sqlite')
+        >>> store.mirror(gerrit, 'status:open')
+        >>> store.query('project:foo label:Code-Review+2 -file:^docs/')
+    """
+
+    OPTIONS = ['CURRENT_FILES', 'CURRENT_REVISION', 'DETAILED_ACCOUNTS',
+               'DETAILED_LABELS']
+
+    def __init__(self, path=':memory:'):
+        """
+        :param path: SQLite database file, in memory by default
+        """
+        self.path = str(path)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.create_function('REGEXP', 2, _regexp)
+        version = self._db.execute('PRAGMA user_version').fetchone()[0]
+        if version == 0 and self._db.execute(
+                'SELECT 1 FROM sqlite_master LIMIT 1').fetchone():
+            self._db.close()
+            raise ValueError('%s is not a ChangeStore database' % self.path)
+        if version not in (0, SCHEMA_VERSION):
+            self._db.close()
+            raise ValueError('%s has the unknown ChangeStore schema %d'
+                             % (self.path, version))
+        with self._db:
+            self._db.executescript(SCHEMA)
+            self._db.execute('PRAGMA user_version = %d' % SCHEMA_VERSION)
+
+    def mirror(self, gerrit, query, page_size=500):
+        """Load every change matching query from the server."""
+        return self.load(gerrit.iter_changes(query, page_size=page_size,
+                                             option=self.OPTIONS))
+
+    def load(self, changes):
+        """
+        Insert or replace changes.
+        :param changes: iterable of ChangeInfo dict or Change
+        :return: number of changes loaded
+        """
+        count = 0
+        with self._lock, self._db:
+            for info in changes:
+                info = getattr(info, 'data', info)
+                self._delete(info['_number'])
+                self._insert(info)
+                count += 1
+        return count
+
+    def remove(self, numbers):
+        """Drop changes by number, eg: the ones ChangeSync removed."""
+        with self._lock, self._db:
+            for number in numbers:
+                self._delete(number)
+
+    def _delete(self, number):
+        for table in TABLES:
+            self._db.execute('DELETE FROM %s WHERE number = ?' % table,
+                             (number,))
+
+    def _insert(self, info):
+        number = info['_number']
+        owner = info.get('owner', {})
+        self._db.execute(
+            'INSERT INTO changes VALUES '
+            '(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (number, info.get('change_id'), info.get('project'),
+             info.get('branch'), info.get('topic'), info.get('status'),
+             info.get('subject'), owner.get('_account_id'),
+             owner.get('name'), owner.get('email'), owner.get('username'),
+             info.get('created'), info.get('updated'),
+             info.get('current_revision'), json.dumps(info)))
+        revisions = info.get('revisions', {})
+        self._db.executemany(
+            'INSERT INTO revisions VALUES (?, ?, ?, ?, ?, ?)',
+            [(number, revision, item.get('_number'), item.get('ref'),
+              item.get('created'),
+              item.get('uploader', {}).get('_account_id'))
+             for revision, item in revisions.items()])
+        current = revisions.get(info.get('current_revision'), {})
+        self._db.executemany(
+            'INSERT INTO files VALUES (?, ?, ?, ?, ?)',
+            [(number, path, item.get('status', 'M'),
+              item.get('lines_inserted', 0), item.get('lines_deleted', 0))
+             for path, item in current.get('files', {}).items()])
+        self._db.executemany('INSERT INTO votes VALUES (?, ?, ?, ?, ?)',
+                             self._votes(number, info.get('labels', {})))
+
+    @staticmethod
+    def _votes(number, labels):
+        for label, item in labels.items():
+            if 'all' in item:
+                for vote in item['all']:
+                    if vote.get('value'):
+                        yield (number, label, vote.get('_account_id'),
+                               vote['value'],
+                               label_state(vote['value'],
+                                           item.get('values')))
+                continue
+            # the value of the vote is unknown
+            for state in LABEL_STATES:
+                if state in item:
+                    yield (number, label, item[state].get('_account_id'),
+                           None, state)
+
+    def _term(self, term):
+        """Translate one search term into a SQL condition with args."""
+        operator, _, value = term.partition(':')
+        if not value:
+            return ('(c.subject LIKE ? OR c.change_id = ?)',
+                    ['%' + term + '%', term])
+        if operator in ('project', 'branch', 'topic'):
+            if value.startswith('^'):
+                return 'c.%s REGEXP ?' % operator, [value]
+            if operator == 'branch':
+                value = value.replace('refs/heads/', '', 1)
+            return 'c.%s = ?' % operator, [value]
+        if operator == 'projects':
+            return "c.project LIKE ? ESCAPE '\\'", [self._like(value) + '%']
+        if operator == 'change' and value.isdigit():
+            return 'c.number = ?', [int(value)]
+        if operator == 'change' and '~' not in value:
+            return 'c.change_id = ?', [value]
+        if operator == 'owner' and value.isdigit():
+            return 'c.owner = ?', [int(value)]
+        # owner:self, the store does not know who is asking
+        if operator == 'owner' and value != 'self':
+            return ('(c.owner_username = ? OR c.owner_email = ? '
+                    'OR c.owner_name = ?)', [value] * 3)
+        if operator in ('status', 'is') and value in STATUSES:
+            statuses = STATUSES[value]
+            return ('c.status IN (%s)' % ', '.join('?' * len(statuses)),
+                    list(statuses))
+        if operator == 'file':
+            if value.startswith('^'):
+                condition, args = 'f.path REGEXP ?', [value]
+            else:
+                like = self._like(value.strip('/'))
+                condition = ("(f.path = ? OR f.path LIKE ? ESCAPE '\\' "
+                             "OR f.path LIKE ? ESCAPE '\\' "
+                             "OR f.path LIKE ? ESCAPE '\\')")
+                args = [value, '%/' + like, like + '/%', '%/' + like + '/%']
+            return ('EXISTS (SELECT 1 FROM files f WHERE '
+                    'f.number = c.number AND %s)' % condition, args)
+        if operator == 'label':
+            return self._label(value)
+        # absolute times only, not relative ones like 1d
+        if operator in ('after', 'since') and DATE_PATTERN.match(value):
+            return 'c.updated >= ?', [value]
+        if operator in ('before', 'until') and DATE_PATTERN.match(value):
+            return 'c.updated <= ?', [value]
+        raise ValueError('Unsupported search operator: %s' % term)
+
+    @staticmethod
+    def _label(value):
+        match = LABEL_STATE_PATTERN.match(value)
+        if match is not None:
+            label, state = match.group('label', 'state')
+            state = LABEL_ALIASES.get(state.lower(), state.lower())
+            if state not in LABEL_STATES:
+                raise ValueError('Unsupported label search: %s' % value)
+            return ('EXISTS (SELECT 1 FROM votes v WHERE v.number = c.number '
+                    'AND v.label = ? AND v.state = ?)', [label, state])
+        match = LABEL_PATTERN.match(value)
+        if match is None:
+            raise ValueError('Unsupported label search: %s' % value)
+        label, op, number = match.group('label', 'op', 'value')
+        op = '=' if op in (None, '=') else op
+        return ('EXISTS (SELECT 1 FROM votes v WHERE v.number = c.number '
+                'AND v.label = ? AND v.value %s ?)' % op, [label, int(number)])
+
+    @staticmethod
+    def _like(value):
+        return value.replace('\\', '\\\\').replace('%', '\\%') \
+            .replace('_', '\\_')
+
+    def where(self, query):
+        """Translate a search query into a SQL WHERE clause with args."""
+        conditions, args, negate = [], [], False
+        for term in shlex.split(query or ''):
+            if term in ('AND', 'and'):
+                continue
+            if term in ('NOT', 'not'):
+                negate = True
+                continue
+            if term in ('OR', 'or') or term[0] in '()':
+                raise ValueError('Only AND-ed terms are supported: %s'
+                                 % query)
+            if term.startswith('-') and len(term) > 1:
+                negate, term = True, term[1:]
+            condition, term_args = self._term(term)
+            conditions.append('NOT ' + condition if negate else condition)
+            args.extend(term_args)
+            negate = False
+        return ' AND '.join(conditions) or '1', args
+
+    def query(self, query='', limit=None):
+        """
+        Search the stored changes, latest updated first.
+        :param query: search query, eg: 'owner:jdoe status:open file:a.py'
+        :param limit: max number of changes returned
+        :return: list of ChangeInfo
+        """
+        where, args = self.where(query)
+        sql = 'SELECT c.data FROM changes c WHERE %s ' \
+              'ORDER BY c.updated DESC' % where
+        if limit:
+            sql += ' LIMIT %d' % int(limit)
+        with self._lock:
+            rows = self._db.execute(sql, args).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def count(self, query=''):
+        where, args = self.where(query)
+        with self._lock:
+            return self._db.execute(
+                'SELECT COUNT(*) FROM changes c WHERE %s' % where,
+                args).fetchone()[0]
+
+    def execute(self, sql, args=()):
+        """Run raw SQL over the tables changes, revisions,
+        files and votes, for aggregations."""
+        with self._lock:
+            return self._db.execute(sql, args).fetchall()
+
+    def close(self):
+        self._db.close()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Date    : 2026-10-17 15:37:04
+# @Author  : Shanming Liu
+
+import datetime
+import json
+import os
+import pathlib
+import time
+
+
+class ChangeSync(object):
+    """
+    Local snapshot of the changes matching a query, kept up to date
+    incrementally: each poll only asks for the changes updated since the
+    high-water mark, the latest `updated` timestamp seen so far.
+    :Example:
+        >>> sync = ChangeSync(gerrit, 'status:open', 'open.json')
+        >>> updated, removed = sync.poll()
+    """
+
+    TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+    def __init__(self, gerrit, query='status:open', state_file=None,
+                 option=None, page_size=500, overlap=1,
+                 reconcile_interval=3600):
+        """
+        :param gerrit: Gerrit instance to query
+        :param query: query selecting the changes to mirror
+        :param state_file: JSON file persisting the snapshot and the
+         high-water mark between runs, in memory only if None
+        :param option: query options of the mirrored ChangeInfo
+        :param page_size: changes requested per page
+        :param overlap: seconds queried again before the high-water mark,
+         as timestamps are compared by the server at second resolution
+        :param reconcile_interval: seconds between full listings of the
+         change numbers detecting deleted changes, the other polls only
+         see the changes updated, never if None
+        """
+        self.gerrit = gerrit
+        self.query = query
+        self.state_file = pathlib.Path(state_file) if state_file else None
+        self.option = option
+        self.page_size = page_size
+        self.overlap = overlap
+        self.reconcile_interval = reconcile_interval
+        self.changes = {}
+        self.high_water = None
+        self.reconciled = 0
+        if self.state_file and self.state_file.exists():
+            self.load()
+
+    def load(self):
+        with self.state_file.open() as state_file:
+            state = json.load(state_file)
+        if state.get('query') != self.query:
+            return
+        self.high_water = state['high_water']
+        self.reconciled = state.get('reconciled', 0)
+        self.changes = {int(number): info
+                        for number, info in state['changes'].items()}
+
+    def save(self):
+        if self.state_file is None:
+            return
+        state = {
+            'query': self.query,
+            'high_water': self.high_water,
+            'reconciled': self.reconciled,
+            'changes': self.changes
+        }
+        # write aside and rename, a crash never leaves a partial file
+        tmp_file = self.state_file.with_suffix('.tmp')
+        with tmp_file.open('w') as out_file:
+            json.dump(state, out_file)
+        os.replace(str(tmp_file), str(self.state_file))
+
+    def since(self):
+        """The after: bound of the next poll, in UTC, with its zone
+        as the server reads a time without zone in its own one."""
+        mark = datetime.datetime.strptime(self.high_water[:19],
+                                          self.TIME_FORMAT)
+        mark -= datetime.timedelta(seconds=self.overlap)
+        return mark.strftime(self.TIME_FORMAT) + ' +0000'
+
+    def _iter(self, query, option=None):
+        return self.gerrit.iter_changes(query, page_size=self.page_size,
+                                        option=option)
+
+    def _update(self, info):
+        self.changes[info['_number']] = info
+        if self.high_water is None or info['updated'] > self.high_water:
+            self.high_water = info['updated']
+
+    def poll(self):
+        """
+        Merge the changes updated since the last poll into the snapshot
+        and drop the ones which stopped matching the query.
+        :return: (updated ChangeInfo list, removed change numbers)
+        """
+        if self.high_water is None:
+            return self.full_sync()
+        since = self.since()
+        updated = []
+        query = '(%s) after:"%s"' % (self.query, since)
+        for info in self._iter(query, self.option):
+            self._update(info)
+            updated.append(info)
+        # merged, abandoned... changes updated out of the query
+        removed = []
+        query = 'NOT (%s) after:"%s"' % (self.query, since)
+        for info in self._iter(query):
+            if self.changes.pop(info['_number'], None) is not None:
+                removed.append(info['_number'])
+        if self.reconcile_interval is not None and \
+                time.time() - self.reconciled > self.reconcile_interval:
+            removed.extend(self.reconcile())
+        self.save()
+        return updated, removed
+
+    def full_sync(self):
+        """Download the whole snapshot again."""
+        previous = set(self.changes)
+        self.changes, self.high_water = {}, None
+        updated = []
+        for info in self._iter(self.query, self.option):
+            self._update(info)
+            updated.append(info)
+        self.reconciled = time.time()
+        self.save()
+        return updated, sorted(previous - set(self.changes))
+
+    def reconcile(self):
+        """Drop the changes which no longer exist, eg: deleted ones,
+        listing only the numbers matching the query."""
+        numbers = {info['_number'] for info in self._iter(self.query)}
+        removed = sorted(set(self.changes) - numbers)
+        for number in removed:
+            del self.changes[number]
+        self.reconciled = time.time()
+        return removed
+
+    def __len__(self):
+        return len(self.changes)
@@ -0,0 +1,195 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Date    : 2026-10-17 11:02:45
+# @Author  : Shanming Liu
+
+import collections
+import fnmatch
+import pathlib
+import sqlite3
+import threading
+import time
+import urllib.parse as urlparse
+
+MISSING = object()
+
+# REST collections, the segment after one of them is the object id
+COLLECTIONS = ('changes', 'projects', 'groups', 'accounts', 'config')
+
+
+def normalize_url(url):
+    """Sort the query params so equivalent urls share one cache key."""
+    parts = urlparse.urlsplit(url)
+    query = urlparse.parse_qsl(parts.query, keep_blank_values=True)
+    query = urlparse.urlencode(sorted(query), safe='+')
+    return urlparse.urlunsplit(parts._replace(query=query, fragment=''))
+
+
+def object_root(path):
+    """
+    Split a request path into the url path of the object it belongs to
+    and the path of that object's collection.
+    :Example:
+        >>> object_root('/a/groups/1/members/1000')
+        >>> ('/a/groups/1', '/a/groups/')
+    """
+    parts = path.split('/')
+    for index, part in enumerate(parts):
+        if part in COLLECTIONS:
+            return ('/'.join(parts[:index + 2]),
+                    '/'.join(parts[:index + 1]) + '/')
+    return path, path
+
+
+class ResponseCache(object):
+    """
+    In-memory cache of decoded GET responses with TTL and LRU eviction.
+    Cached values are shared between callers, do not modify them.
+    :Example:
+        >>> cache = ResponseCache(maxsize=512, ttl=30,
+                                  ttls={'*/config/server/*': 3600,
+                                        '*/members': 300})
+        >>> gerrit = Gerrit(url, user, token, cache=cache)
+    """
+
+    def __init__(self, maxsize=1024, ttl=60, ttls=None):
+        """
+        :param maxsize: max number of cached responses
+        :param ttl: default time to live in seconds
+        :param ttls: time to live per endpoint, fnmatch pattern of
+         the url path to seconds, first match wins, 0 disables caching
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.ttls = list((ttls or {}).items())
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def ttl_for(self, path):
+        for pattern, ttl in self.ttls:
+            if fnmatch.fnmatchcase(path, pattern):
+                return ttl
+        return self.ttl
+
+    def get(self, url):
+        """Return the cached response of url or MISSING."""
+        key = normalize_url(url)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return MISSING
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, url, value):
+        key = normalize_url(url)
+        ttl = self.ttl_for(urlparse.urlsplit(key).path)
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, url):
+        """
+        Drop the responses made stale by a write request on url: anything
+        under the object it belongs to and the listing of its collection.
+        """
+        root, collection = object_root(urlparse.urlsplit(url).path)
+        with self._lock:
+            for key in list(self._entries):
+                path = urlparse.urlsplit(key).path
+                if path == collection or path == root or \
+                        path.startswith(root + '/'):
+                    del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self._entries)
+        }
+
+
+class DiskCache(object):
+    """
+    SQLite backed store of GET response bodies with their ETag.
+    GerritSession sends If-None-Match for stored urls and serves
+    304 Not Modified responses from disk, entries survive restarts.
+    """
+
+    def __init__(self, directory, max_entries=10000):
+        """
+        :param directory: directory of the cache database
+        :param max_entries: entries kept, the least recently
+         refreshed ones are pruned beyond that
+        """
+        path = pathlib.Path(directory).expanduser()
+        path.mkdir(parents=True, exist_ok=True)
+        self.path = path / 'http-cache.sqlite'
+        self.max_entries = max_entries
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False)
+        with self._db:
+            self._db.execute('CREATE TABLE IF NOT EXISTS responses ('
+                             'url TEXT PRIMARY KEY, path TEXT, etag TEXT, '
+                             'body BLOB, updated REAL)')
+            self._db.execute('CREATE INDEX IF NOT EXISTS responses_path '
+                             'ON responses (path)')
+
+    def get(self, url):
+        """Return (etag, body) stored for url or None."""
+        with self._lock:
+            return self._db.execute(
+                'SELECT etag, body FROM responses WHERE url = ?',
+                (normalize_url(url),)).fetchone()
+
+    def set(self, url, etag, body):
+        key = normalize_url(url)
+        with self._lock, self._db:
+            self._db.execute(
+                'INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)',
+                (key, urlparse.urlsplit(key).path, etag, body, time.time()))
+            self._writes += 1
+            if self._writes % 100 == 0:
+                self._db.execute(
+                    'DELETE FROM responses WHERE url NOT IN (SELECT url '
+                    'FROM responses ORDER BY updated DESC LIMIT ?)',
+                    (self.max_entries,))
+
+    def touch(self, url):
+        """Mark the entry of url as revalidated."""
+        with self._lock, self._db:
+            self._db.execute('UPDATE responses SET updated = ? WHERE url = ?',
+                             (time.time(), normalize_url(url)))
+
+    def invalidate(self, url):
+        """Drop the entries made stale by a write request on url,
+        see ResponseCache.invalidate."""
+        root, collection = object_root(urlparse.urlsplit(url).path)
+        pattern = root.replace('\\', '\\\\').replace('%', '\\%') \
+            .replace('_', '\\_') + '/%'
+        with self._lock, self._db:
+            self._db.execute(
+                "DELETE FROM responses WHERE path IN (?, ?) "
+                "OR path LIKE ? ESCAPE '\\'", (root, collection, pattern))
+
+    def clear(self):
+        with self._lock, self._db:
+            self._db.execute('DELETE FROM responses')
+
+    def close(self):
+        self._db.close()
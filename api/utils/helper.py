@@ -3,15 +3,26 @@
 # @Date    : 2018-04-04 14:10:35
 # @Author  : Shanming Liu
 
+import binascii
 import collections
+import codecs
+import concurrent.futures as futures
+import email.utils
+import hashlib
+import importlib
 import json
 import logging
 import pathlib
+import queue
+import random
 import sys
+import threading
+import time
 import requests
 import urllib.parse as urlparse
-import weakref
 
+from . import metrics
+from .cache import MISSING, normalize_url
 from .exceptions import GerritError
 
 # requests.urllib3.disable_warnings()
@@ -77,58 +88,864 @@ def expand_dot_dict(data, res=None):
     return res
 
 
+def page_items(page, more_key, page_size):
+    """Normalize one page of a list endpoint into (items, more)."""
+    if isinstance(page, dict):
+        # list endpoints without query return a map keyed by name
+        items = [dict(info, name=name) for name, info in page.items()]
+        return items, bool(page_size) and len(items) >= page_size
+    return page, bool(page) and bool(page[-1].get(more_key))
+
+
+def clean_params(params):
+    """Drop empty values from params and encode them into a query string,
+    keeping '+' unescaped as Gerrit queries use it."""
+    if hasattr(params, "items"):
+        params = params.items()
+    params = [(k, v) for k, v in params if v]
+    return urlparse.urlencode(params, doseq=True, safe='+')
+
+
+XSSI_PREFIX = b")]}'"
+
+JSON_BACKENDS = ('orjson', 'ujson', 'json')
+
+_json_loads = None
+_json_zero_copy = False
+
+
+def set_json_backend(backend=None):
+    """
+    Select the JSON parser used to decode responses.
+    :param backend: 'orjson', 'ujson', 'json' or a loads callable
+     accepting bytes, the fastest installed one if None
+    :return: name of the selected backend
+    """
+    global _json_loads, _json_zero_copy
+    if callable(backend):
+        _json_loads, _json_zero_copy = backend, False
+        return getattr(backend, '__module__', None) or repr(backend)
+    for name in ([backend] if backend else JSON_BACKENDS):
+        try:
+            module = importlib.import_module(name)
+        except ImportError:
+            if backend:
+                raise
+            continue
+        # only orjson parses a memoryview, saving the copy of the body
+        _json_loads, _json_zero_copy = module.loads, name == 'orjson'
+        return name
+
+
+def decode_content(content, encoding='utf-8'):
+    """
+    Strip the exact XSSI prefix of a raw Gerrit response and decode its
+    JSON, or return the body as text when it is not JSON.
+    :param content: response body, bytes
+    :param encoding: charset of the body for the text fallback
+    """
+    if _json_loads is None:
+        set_json_backend()
+    body = content
+    if content[:len(XSSI_PREFIX)] == XSSI_PREFIX:
+        body = memoryview(content)[len(XSSI_PREFIX):] \
+            if _json_zero_copy else content[len(XSSI_PREFIX):]
+    try:
+        return _json_loads(body)
+    except ValueError:
+        return content.decode(encoding or 'utf-8', 'replace')
+
+
+# chars which may continue a JSON number
+NUMBER_CHARS = frozenset('0123456789.eE+-')
+
+
+def iter_json_items(chunks, encoding='utf-8'):
+    """
+    Incrementally parse a Gerrit JSON response given as byte chunks,
+    yielding the elements of its top level array, or (key, value) pairs
+    when it is an object, as soon as each one is complete.
+    Peak memory is about one element plus one chunk.
+    :param chunks: iterable of bytes, eg: resp.iter_content(65536)
+    :param encoding: charset of the body
+    """
+    decoder = json.JSONDecoder()
+    text = codecs.getincrementaldecoder(encoding or 'utf-8')()
+    chunks = iter(chunks)
+    buf, pos, eof = '', 0, False
+
+    def read(size=0):
+        # append chunks until size chars are buffered after pos
+        nonlocal buf, pos, eof
+        pending = [buf[pos:]]
+        length = len(pending[0])
+        for chunk in chunks:
+            pending.append(text.decode(chunk))
+            length += len(pending[-1])
+            if length > size:
+                break
+        else:
+            pending.append(text.decode(b'', final=True))
+            eof = True
+        buf, pos = ''.join(pending), 0
+
+    def peek(skipped=''):
+        # next significant char, '' at the end of the body
+        nonlocal pos
+        while True:
+            while pos < len(buf) and (buf[pos] in skipped or
+                                      buf[pos].isspace()):
+                pos += 1
+            if pos < len(buf) or eof:
+                return buf[pos:pos + 1]
+            read()
+
+    def parse():
+        nonlocal pos
+        while True:
+            try:
+                value, end = decoder.raw_decode(buf, pos)
+            except ValueError:
+                if eof:
+                    raise
+            else:
+                # a value ending with the buffer, or a number followed
+                # by a char which may go on with it, eg: 12|.5 or 1e|-5,
+                # may be cut by the chunk boundary
+                cut = end == len(buf) or \
+                    isinstance(value, (int, float)) and \
+                    buf[end] in NUMBER_CHARS
+                if eof or not cut:
+                    pos = end
+                    return value
+            # double the buffer to stay linear on large elements
+            read(2 * (len(buf) - pos))
+
+    while len(buf) < len(XSSI_PREFIX) and not eof:
+        read(len(XSSI_PREFIX))
+    if buf.startswith(XSSI_PREFIX.decode()):
+        pos = len(XSSI_PREFIX)
+    opening = peek()
+    if opening not in ('[', '{'):
+        raise ValueError('Expecting a JSON array or object, got %r'
+                         % buf[pos:pos + 20])
+    closing = ']' if opening == '[' else '}'
+    pos += 1
+    while True:
+        char = peek(',')
+        if char == closing:
+            return
+        if not char:
+            raise ValueError('Truncated JSON response')
+        if opening == '[':
+            yield parse()
+        else:
+            key = parse()
+            peek(':')
+            yield key, parse()
+
+
+def paginate(session, url, params=None, more_key=None, page_size=None,
+             start_key='S', limit_key='n', prefetch=0, stream=False):
+    """
+    Walk a paginated Gerrit list endpoint and yield its items one by one.
+    Only one page is held in memory at a time, and items of the first page
+    are yielded before the next page is requested.
+    :param session: GerritSession used to send the requests
+    :param url: list endpoint url
+    :param params: extra query params
+    :param more_key: flag Gerrit sets on the last item when more results
+     exist, e.g. '_more_changes'
+    :param page_size: items requested per page, server default if None
+    :param start_key: name of the start offset param
+    :param limit_key: name of the page size param
+    :param prefetch: number of following pages to fetch in background
+     while the current one is consumed, 0 to fetch sequentially
+    :param stream: parse each page incrementally while it downloads,
+     so that only one item is held in memory, exclusive with prefetch
+    """
+    params = dict(params or {})
+    start = params.pop(start_key, None) or 0
+    if stream:
+        if prefetch:
+            raise ValueError('prefetch is not supported with stream')
+        yield from _stream_pages(session, url, params, more_key, page_size,
+                                 start_key, limit_key, start)
+        return
+
+    def fetch(offset, size):
+        page_params = dict(params)
+        page_params[start_key] = offset
+        page_params[limit_key] = size
+        return session.get(url, params=page_params)
+
+    items, more = page_items(fetch(start, page_size), more_key, page_size)
+    start += len(items)
+    yield from items
+    if not more:
+        return
+    if prefetch:
+        # the first page tells the real page size when the server caps it
+        page_size = min(page_size, len(items)) if page_size else len(items)
+        yield from _prefetch_pages(fetch, start, page_size,
+                                   more_key, prefetch)
+        return
+    while more:
+        items, more = page_items(fetch(start, page_size),
+                                 more_key, page_size)
+        start += len(items)
+        yield from items
+
+
+def _stream_pages(session, url, params, more_key, page_size,
+                  start_key, limit_key, start):
+    """Yield items of the pages from start on,
+    parsing each page while it downloads."""
+    more = True
+    while more:
+        params[start_key] = start
+        params[limit_key] = page_size
+        count, more = 0, False
+        for item in session.iter_items(url, params=params):
+            if isinstance(item, tuple):
+                # list endpoints without query return a map keyed by name
+                item = dict(item[1], name=item[0])
+                more = bool(page_size) and count + 1 >= page_size
+            else:
+                more = bool(item.get(more_key))
+            count += 1
+            yield item
+        start += count
+
+
+def _prefetch_pages(fetch, start, page_size, more_key, prefetch):
+    """Yield items of the pages from start on, in order, keeping up to
+    prefetch pages in flight on a bounded worker pool."""
+    pool = futures.ThreadPoolExecutor(max_workers=prefetch)
+    pending = collections.deque()
+    next_start = start
+    try:
+        while True:
+            while len(pending) <= prefetch:
+                pending.append(pool.submit(fetch, next_start, page_size))
+                next_start += page_size
+            items, more = page_items(pending.popleft().result(),
+                                     more_key, page_size)
+            start += len(items)
+            yield from items
+            if not more:
+                return
+            if len(items) < page_size:
+                # server capped the page, speculative offsets are wrong
+                for future in pending:
+                    future.cancel()
+                pending.clear()
+                page_size = len(items)
+                next_start = start
+    finally:
+        for future in pending:
+            future.cancel()
+        pool.shutdown(wait=False)
+
+
+class BatchResult(collections.namedtuple('BatchResult',
+                                         'item result error elapsed')):
+    """Outcome of one call of a batch, elapsed is in seconds."""
+    __slots__ = ()
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+def _timed_call(func, item):
+    start = time.perf_counter()
+    try:
+        result, error = func(item), None
+    except Exception as e:
+        result, error = None, e
+    return BatchResult(item, result, error, time.perf_counter() - start)
+
+
+def iter_batch(func, items, workers=8, progress=None):
+    """
+    Call func for every item on a bounded thread pool and yield
+    (index, BatchResult) pairs as the calls complete.
+    An exception raised for one item is kept in its result
+    and does not abort the others.
+    :param progress: optional callable(done, total, result)
+     called as each call completes
+    """
+    with futures.ThreadPoolExecutor(max_workers=workers) as pool:
+        jobs = {pool.submit(_timed_call, func, item): index
+                for index, item in enumerate(items)}
+        for done, job in enumerate(futures.as_completed(jobs), 1):
+            if progress is not None:
+                progress(done, len(jobs), job.result())
+            yield jobs[job], job.result()
+
+
+def iter_stream(func, items, workers=8, backlog=None):
+    """
+    Like iter_batch for items produced over time, e.g. the lines of
+    a pipe: a thread reads items and submits them as they arrive, with
+    at most backlog (default 2 * workers) submitted and not yet yielded.
+    An exception raised by items is raised once the calls already
+    submitted are yielded.
+    """
+    backlog = backlog or 2 * workers
+    slots = threading.Semaphore(backlog)
+    done = queue.Queue()
+    pool = futures.ThreadPoolExecutor(max_workers=workers)
+    stopped = threading.Event()
+
+    def feed():
+        count, error = 0, None
+        try:
+            for index, item in enumerate(items):
+                slots.acquire()
+                if stopped.is_set():
+                    break
+                job = pool.submit(_timed_call, func, item)
+                job.add_done_callback(
+                    lambda job, index=index: done.put((index, job)))
+                count += 1
+        except Exception as e:
+            error = e
+        done.put((count, error))
+
+    threading.Thread(target=feed, daemon=True).start()
+    received, total, error = 0, None, None
+    try:
+        while total is None or received < total:
+            index, job = done.get()
+            if not isinstance(job, futures.Future):
+                total, error = index, job
+                continue
+            received += 1
+            slots.release()
+            yield index, job.result()
+        if error is not None:
+            raise error
+    finally:
+        stopped.set()
+        slots.release()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def run_batch(func, items, workers=8, progress=None):
+    """Call func for every item concurrently,
+    return the list of BatchResult in input order."""
+    results = dict(iter_batch(func, items, workers, progress))
+    return [results[index] for index in range(len(results))]
+
+
+def retry_after(resp):
+    """Seconds to wait requested by the Retry-After header, or None."""
+    value = resp.headers.get('Retry-After')
+    if not value:
+        return None
+    if value.isdigit():
+        return int(value)
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0, date.timestamp() - time.time())
+
+
+class TokenBucket(object):
+    """Client side rate limiter, allows rate requests per second
+    on average with bursts of up to burst requests."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.burst = burst or max(1, int(rate))
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Take one token, sleeping until one is available."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens +
+                               (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+        if wait:
+            time.sleep(wait)
+
+
+class SingleFlight(object):
+    """Deduplicate concurrent calls: callers of a key already in flight
+    wait for its result instead of calling again. Nothing is kept once
+    the call returns."""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, func, *args, **kwargs):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = futures.Future()
+        if not leader:
+            return call.result()
+        try:
+            call.set_result(func(*args, **kwargs))
+        except BaseException as e:
+            call.set_exception(e)
+        finally:
+            with self._lock:
+                del self._calls[key]
+        return call.result()
+
+
+class Base64Decoder(object):
+    """Incremental base64 decoder, fed with chunks split anywhere."""
+
+    WHITESPACE = b' \t\r\n'
+
+    def __init__(self):
+        self.pending = b''
+
+    def decode(self, chunk):
+        data = self.pending + chunk.translate(None, self.WHITESPACE)
+        size = len(data) - len(data) % 4
+        self.pending = data[size:]
+        return binascii.a2b_base64(data[:size])
+
+    def flush(self):
+        data, self.pending = self.pending, b''
+        return binascii.a2b_base64(data) if data else b''
+
+
 class GerritSession(requests.Session):
     """docstring for GerritSession"""
 
-    def __init__(self, username, password, timeout=10, logger=None):
+    _shared = {}
+    _shared_lock = threading.Lock()
+
+    IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'PUT',
+                                    'DELETE', 'OPTIONS'])
+
+    def __init__(self, username, password, timeout=10, logger=None,
+                 pool_connections=10, pool_maxsize=10, pool_block=False,
+                 keep_alive=True, cache=None, disk_cache=None,
+                 retries=0, backoff_factor=0.5, backoff_max=30,
+                 retry_statuses=(429, 502, 503, 504),
+                 rate_limit=None, burst=None, coalesce=False,
+                 listeners=None):
+        """
+        :param timeout: request timeout in seconds
+        :param logger: logger for requests, a new one if None
+        :param pool_connections: number of host pools to cache
+        :param pool_maxsize: max number of keep-alive connections
+         kept per host, set it to the number of threads sharing the session
+        :param pool_block: wait for a free connection when the pool
+         is exhausted instead of opening a throwaway one
+        :param keep_alive: reuse connections between requests, True,
+         False to close them after each request, or the max seconds a
+         connection stays idle before it is reconnected, eg: below the
+         keep-alive timeout of a proxy in front of the server
+        :param cache: optional cache.ResponseCache for GET responses,
+         write requests invalidate the entries of the object they touch
+        :param disk_cache: optional cache.DiskCache, GET requests are sent
+         with If-None-Match and 304 responses are served from it
+        :param retries: max retries of idempotent requests failing with
+         a retry_statuses code or a connection error, a 429 is retried
+         for any method as the server did not process the request
+        :param backoff_factor: base of the exponential backoff in seconds,
+         the delay before retry n is random in
+         [0, min(backoff_max, backoff_factor * 2 ** n)],
+         unless the server sends Retry-After
+        :param backoff_max: max backoff delay in seconds
+        :param retry_statuses: HTTP status codes worth retrying
+        :param rate_limit: max requests per second sent by this session
+        :param burst: max requests sent at once under rate_limit
+        :param coalesce: let concurrent identical GET requests share
+         the response of the first one instead of each sending its own,
+         the shared response must not be modified
+        :param listeners: callables called with the
+         metrics.RequestMetrics of every request, see add_listener
+        """
         super(GerritSession, self).__init__()
         self.auth = requests.auth.HTTPBasicAuth(username, password)
         # self.headers["Content-Type"] = "application/json; charset=UTF-8"
         # self.verify = False
 
+        max_idle = None if isinstance(keep_alive, bool) else keep_alive
+        adapter = metrics.TimedHTTPAdapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            pool_block=pool_block,
+            max_idle=max_idle)
+        self.mount('https://', adapter)
+        self.mount('http://', adapter)
+        if keep_alive is False:
+            self.headers['Connection'] = 'close'
+
         self.timeout = timeout
         self.logger = logger if logger else get_logger('GerritSession')
+        self.cache = cache
+        self.disk_cache = disk_cache
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.backoff_max = backoff_max
+        self.retry_statuses = frozenset(retry_statuses)
+        self.rate_limiter = TokenBucket(rate_limit, burst) \
+            if rate_limit else None
+        self.flights = SingleFlight() if coalesce else None
+        self.listeners = list(listeners or [])
+
+    @classmethod
+    def shared(cls, baseurl, username, password, **kwargs):
+        """
+        Return the session shared by all callers of the same host
+        and credentials, creating it with kwargs on first use.
+        Raise ValueError if it was created with other kwargs.
+        """
+        parts = urlparse.urlsplit(baseurl)
+        # the registry does not hold the password itself
+        secret = hashlib.sha256((password or '').encode('utf-8'))
+        key = (parts.scheme, parts.netloc, username, secret.hexdigest())
+        with cls._shared_lock:
+            if key not in cls._shared:
+                cls._shared[key] = (cls(username, password, **kwargs),
+                                    kwargs)
+            session, options = cls._shared[key]
+        if options != kwargs:
+            conflicts = sorted(name for name in set(options) | set(kwargs)
+                               if options.get(name) != kwargs.get(name))
+            raise ValueError('The shared session of %s was created with '
+                             'other options: %s' % (parts.netloc,
+                                                    ', '.join(conflicts)))
+        return session
+
+    def add_listener(self, listener):
+        """
+        Call listener with the metrics.RequestMetrics of each request
+        once it completes, including the ones served from a cache,
+        eg: metrics.MetricsCollector. A streamed response completes
+        when it is closed. Listeners run in the thread which sent or
+        closed the request and should be quick.
+        """
+        self.listeners.append(listener)
+
+    def remove_listener(self, listener):
+        self.listeners.remove(listener)
+
+    def emit(self, record):
+        for listener in list(self.listeners):
+            try:
+                listener(record)
+            except Exception:
+                self.logger.exception('Metrics listener %r failed',
+                                      listener)
 
     def prepare_request(self, request):
         if request.params:
             # remove not exists value from params
-            params = request.params
-            if hasattr(params, "items"):
-                params = params.items()
-            params = [(k, v) for k, v in params if v]
-            request.params = urlparse.urlencode(params,
-                                                doseq=True,
-                                                safe='+')
+            request.params = clean_params(request.params)
         return super().prepare_request(request)
 
+    def backoff(self, attempt):
+        delay = min(self.backoff_max, self.backoff_factor * 2 ** attempt)
+        return random.uniform(0, delay)
+
+    def send_with_retries(self, request, **kwargs):
+        """Send request through the rate limiter,
+        retrying transient failures with backoff."""
+        record = metrics.current()
+        attempt = 0
+        while True:
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+            if record is not None:
+                record.attempt()
+            retryable = attempt < self.retries
+            idempotent = request.method in self.IDEMPOTENT_METHODS
+            try:
+                resp = super().send(request, **kwargs)
+            except (requests.exceptions.ConnectionError,
+                    requests.exceptions.Timeout) as e:
+                if not (retryable and idempotent):
+                    raise
+                delay = self.backoff(attempt)
+                self.logger.warning('Retry %s request in %.1fs: %s',
+                                    request.method, delay, str(e))
+            else:
+                status = resp.status_code
+                if not retryable or status not in self.retry_statuses or \
+                        not (idempotent or status == 429):
+                    return resp
+                delay = retry_after(resp)
+                if delay is None:
+                    delay = self.backoff(attempt)
+                self.logger.warning('Retry %s request in %.1fs: %s %s',
+                                    request.method, delay, status, resp.url)
+                resp.close()
+            attempt += 1
+            if record is not None:
+                record.retries = attempt
+            time.sleep(delay)
+
     def send(self, request, **kwargs):
+        if request.method != 'GET' or kwargs.get('stream'):
+            return self.fetch(request, **kwargs)
+        if self.cache is not None:
+            content = self.cache.get(request.url)
+            if content is not MISSING:
+                self.logger.debug('Cached %s request: %s',
+                                  request.method, request.url)
+                if self.listeners:
+                    record = metrics.RequestMetrics(request.method,
+                                                    request.url)
+                    record.cache = 'memory'
+                    self.emit(record.finish())
+                return content
+        if self.flights is not None:
+            return self.flights.do(normalize_url(request.url),
+                                   self.fetch, request, **kwargs)
+        return self.fetch(request, **kwargs)
+
+    def fetch(self, request, **kwargs):
+        """Send request through the disk cache and the retries,
+        and decode its response, measured for the listeners."""
+        if not self.listeners:
+            return self._fetch(request, None, **kwargs)
+        record = metrics.RequestMetrics(request.method, request.url)
+        body = request.body or b''
+        record.request_size = len(body.encode('utf-8')
+                                  if isinstance(body, str) else body)
+        metrics.track(record)
+        streamed = False
+        try:
+            content = self._fetch(request, record, **kwargs)
+            if kwargs.get('stream'):
+                self._emit_on_close(content, record)
+                streamed = True
+            return content
+        except Exception as e:
+            record.error = type(e).__name__
+            raise
+        finally:
+            metrics.track(None)
+            if not streamed:
+                self.emit(record.finish())
+
+    def _emit_on_close(self, resp, record):
+        """Measure the body of a streamed response, and emit its
+        metrics, once it is closed."""
+        close = resp.close
+
+        def close_and_emit():
+            close()
+            if record.total is None:
+                record.streamed()
+                self.emit(record.finish())
+
+        resp.metrics = record
+        resp.close = close_and_emit
+
+    def _fetch(self, request, record, **kwargs):
+        stream = kwargs.get('stream', False)
+        cacheable = self.cache is not None and request.method == 'GET' \
+            and not stream
+        stored = None
+        if self.disk_cache is not None and request.method == 'GET' \
+                and not stream:
+            stored = self.disk_cache.get(request.url)
+            if stored:
+                request.headers['If-None-Match'] = stored[0]
         self.logger.debug('Send %s request: %s',
                           request.method, request.url)
         kwargs.setdefault('timeout', self.timeout)
-        resp = super().send(request, **kwargs)
+        resp = self.send_with_retries(request, **kwargs)
+        if record is not None:
+            record.received(resp, downloaded=not stream)
+        if request.method != 'GET':
+            if self.cache is not None:
+                self.cache.invalidate(request.url)
+            if self.disk_cache is not None:
+                self.disk_cache.invalidate(request.url)
         try:
             resp.raise_for_status()
         except requests.exceptions.HTTPError as e:
             self.logger.error('Error: %s', str(e))
             self.logger.error('Reason: %s', e.response.text)
             raise GerritError(e.response.text)
+        if stream:
+            return resp
+        if stored and resp.status_code == 304:
+            self.logger.debug('Not modified: %s', request.url)
+            self.disk_cache.touch(request.url)
+            start = time.perf_counter()
+            content = decode_content(stored[1])
+            if record is not None:
+                record.cache = 'disk'
+        else:
+            if self.disk_cache is not None and request.method == 'GET' \
+                    and resp.headers.get('ETag'):
+                self.disk_cache.set(request.url, resp.headers['ETag'],
+                                    resp.content)
+            start = time.perf_counter()
+            content = decode_content(resp.content, resp.encoding)
+        if record is not None:
+            record.decode = time.perf_counter() - start
+        if cacheable:
+            self.cache.set(request.url, content)
+        return content
+
+    def iter_items(self, url, params=None, chunk_size=65536):
+        """
+        GET a list endpoint and yield its elements while the response
+        is downloaded, see iter_json_items.
+        The response cache is bypassed.
+        """
+        resp = self.get(url, params=params, stream=True)
         try:
-            content = resp.text.lstrip(")]}'")
-            return json.loads(content)
-        except json.JSONDecodeError:
-            return resp.text
+            yield from iter_json_items(iter_body(resp, chunk_size),
+                                       resp.encoding)
+        finally:
+            resp.close()
+
+    def download(self, url, dest, params=None, base64=False,
+                 resume=False, chunk_size=1 << 20):
+        """
+        GET url and write its body to dest chunk by chunk, memory stays
+        bounded whatever the size of the response.
+        :param dest: file path or binary file object
+        :param base64: decode the base64 body on the fly,
+         eg: for /patch or /files/{file}/content
+        :param resume: for a file path, skip it if already downloaded and
+         continue a partial download with a Range request when the body is
+         not base64 encoded
+        :return: dest
+        """
+        if hasattr(dest, 'write'):
+            self._download(url, dest, params, base64, 0, chunk_size)
+            return dest
+        dest = pathlib.Path(dest)
+        if resume and dest.exists():
+            return dest
+        part, offset = part_file(dest, resume and not base64)
+        with part.open('ab' if offset else 'wb') as out_file:
+            self._download(url, out_file, params, base64, offset, chunk_size)
+        part.replace(dest)
+        return dest
+
+    def _download(self, url, out_file, params, base64, offset, chunk_size):
+        headers = {'Range': 'bytes=%d-' % offset} if offset else None
+        resp = self.get(url, params=params, headers=headers, stream=True)
+        try:
+            if offset and resp.status_code != 206:
+                # range ignored, the whole body is sent again
+                out_file.seek(0)
+                out_file.truncate()
+            decoder = Base64Decoder() if base64 else None
+            for chunk in iter_body(resp, chunk_size):
+                out_file.write(decoder.decode(chunk) if decoder else chunk)
+            if decoder:
+                out_file.write(decoder.flush())
+        finally:
+            resp.close()
+
+
+def iter_body(resp, chunk_size):
+    """resp.iter_content adding the size of the chunks to the
+    response_size of the metrics of resp, if measured."""
+    record = getattr(resp, 'metrics', None)
+    for chunk in resp.iter_content(chunk_size):
+        if record is not None:
+            record.response_size = (record.response_size or 0) + len(chunk)
+        yield chunk
+
+
+def part_file(dest, resume):
+    """Temporary file of a download to dest, renamed once complete,
+    and the offset to continue it from if resume."""
+    part = dest.with_name(dest.name + '.part')
+    offset = part.stat().st_size if resume and part.exists() else 0
+    return part, offset
 
 
 class GerritMixin(object):
-    """docstring for GerritMixin"""
+    """
+    Base of the REST entities, hydrated lazily.
+    Fields the server already sent are given as data and read as
+    attributes or items, eg: change.subject or change['topic'] for
+    fields shadowed by a method. The first access to a missing field
+    of FIELDS fetches the entity once with info(), other names only
+    read the fields already known.
+    """
+
+    __slots__ = ('gerrit', 'path', '_data', '_loaded')
+
+    # fields of the entity info the server may send
+    FIELDS = frozenset()
 
-    def __init__(self, gerrit, url_path):
+    def __init__(self, gerrit, url_path, data=None):
         self.gerrit = gerrit
-        self.baseurl = urlparse.urljoin(gerrit.baseurl, url_path)
-        self.session = weakref.proxy(gerrit.session)
-        self.logger = weakref.proxy(gerrit.logger)
+        self.path = url_path
+        self._data = data
+        self._loaded = False
+
+    @property
+    def baseurl(self):
+        return self.gerrit.baseurl + self.path
+
+    @property
+    def session(self):
+        return self.gerrit.session
+
+    @property
+    def logger(self):
+        return self.gerrit.logger
+
+    @property
+    def data(self):
+        """Fields known so far, without fetching."""
+        return self._data if self._data is not None else {}
+
+    def hydrate(self, data):
+        """Merge fields sent by the server into the known ones."""
+        if isinstance(data, dict):
+            self._data = dict(self.data, **data)
+        return data
+
+    def fetch(self):
+        """Get the entity fields from the server."""
+        return self.session.get(self.baseurl)
+
+    def __getitem__(self, name):
+        if name not in self.data and not self._loaded:
+            resp = self.fetch()
+            if not isinstance(resp, dict):
+                # an AsyncGerrit returns a coroutine, it can not be waited
+                getattr(resp, 'close', lambda: None)()
+                raise KeyError('%s not loaded, await info() first' % name)
+            self._loaded = True
+            self.hydrate(resp)
+        return self.data[name]
+
+    def __getattr__(self, name):
+        # a typo must not send a request, unset slots must not recurse
+        if name not in self.FIELDS and \
+                (name.startswith('_') or name not in self.data):
+            raise AttributeError('%s has no field %s'
+                                 % (type(self).__name__, name))
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError('%s has no field %s'
+                                 % (type(self).__name__, name))
 
     def info(self, **params):
         params = [(k, v) for k, v in params.items() if v]
-        return self.session.get(self.baseurl,
-                                params=params)
+        return self.hydrate(self.session.get(self.baseurl,
+                                             params=params))
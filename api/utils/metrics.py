@@ -0,0 +1,384 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Date    : 2026-10-17 17:24:06
+# @Author  : Shanming Liu
+
+"""Request instrumentation of GerritSession.
+
+GerritSession measures each request into a RequestMetrics and passes it
+to its listeners, MetricsCollector is a listener aggregating them per
+endpoint with percentiles and a Prometheus text exporter.
+:Example:
+    >>> collector = MetricsCollector().attach(gerrit)
+    >>> ...
+    >>> print(collector.report())
+    >>> text = collector.prometheus()
+"""
+
+import collections
+import math
+import threading
+import time
+import urllib.parse as urlparse
+
+import requests
+import urllib3
+
+# path segments followed by an object id, replaced by {id} in endpoints
+ID_SEGMENTS = ('changes', 'projects', 'groups', 'accounts', 'revisions',
+               'files', 'branches', 'tags', 'members', 'reviewers',
+               'comments', 'drafts', 'children', 'emails', 'keys')
+
+_local = threading.local()
+
+
+def endpoint(url):
+    """
+    Url path with the object ids replaced, which groups the requests
+    of one REST endpoint.
+    :Example:
+        >>> endpoint('https://host/a/changes/123/revisions/1/files')
+        >>> '/a/changes/{id}/revisions/{id}/files'
+    """
+    parts = urlparse.urlsplit(url).path.split('/')
+    for index in range(1, len(parts)):
+        if parts[index - 1] in ID_SEGMENTS and parts[index]:
+            parts[index] = '{id}'
+    return '/'.join(parts)
+
+
+def current():
+    """RequestMetrics of the request this thread is sending, or None."""
+    return getattr(_local, 'metrics', None)
+
+
+def track(record):
+    """Make record the current one of this thread, None to stop."""
+    _local.metrics = record
+
+
+class RequestMetrics(object):
+    """
+    Measures of one request, durations in seconds, sizes in bytes.
+    connect covers the connections opened, with their TLS handshake,
+    ttfb the wait for the response headers, download the body, decode
+    the JSON parsing. A phase not run, eg: decode of a streamed
+    response, is None. cache is 'memory' or 'disk' when the response
+    was served from ResponseCache or DiskCache.
+    """
+
+    __slots__ = ('method', 'url', 'endpoint', 'status', 'retries', 'cache',
+                 'connect', 'ttfb', 'download', 'decode', 'total',
+                 'request_size', 'response_size', 'error', '_start',
+                 '_attempt', '_received')
+
+    PHASES = ('connect', 'ttfb', 'download', 'decode', 'total')
+
+    def __init__(self, method, url):
+        self.method = method
+        self.url = url
+        self.endpoint = endpoint(url)
+        self.status = None
+        self.retries = 0
+        self.cache = None
+        self.connect = 0.0
+        self.ttfb = None
+        self.download = None
+        self.decode = None
+        self.total = None
+        self.request_size = 0
+        self.response_size = None
+        self.error = None
+        self._start = time.perf_counter()
+        self._attempt = (self._start, 0.0)
+        self._received = None
+
+    def attempt(self):
+        """Mark the start of one attempt at sending the request."""
+        self._attempt = (time.perf_counter(), self.connect)
+
+    def received(self, resp, downloaded=True):
+        """Split the time of the last attempt once resp is received,
+        its body too unless it is streamed."""
+        start, connect = self._attempt
+        self._received = time.perf_counter()
+        headers = resp.elapsed.total_seconds()
+        self.status = resp.status_code
+        self.ttfb = max(0.0, headers - (self.connect - connect))
+        if downloaded:
+            self.download = max(0.0, time.perf_counter() - start - headers)
+            self.response_size = len(resp.content)
+
+    def streamed(self):
+        """Time the body of a streamed response once consumed,
+        response_size is counted by the reader, see GerritSession."""
+        if self._received is not None:
+            self.download = time.perf_counter() - self._received
+
+    def finish(self):
+        self.total = time.perf_counter() - self._start
+        return self
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__
+                if not name.startswith('_')}
+
+    def __repr__(self):
+        return '<RequestMetrics %s %s %s %.3fs>' % (
+            self.method, self.endpoint, self.status or self.cache,
+            self.total or 0)
+
+
+class TimedHTTPConnection(urllib3.connection.HTTPConnection):
+    """HTTPConnection adding its connect time to the current metrics."""
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            super().connect()
+        finally:
+            record = current()
+            if record is not None:
+                record.connect += time.perf_counter() - start
+
+
+class TimedHTTPSConnection(urllib3.connection.HTTPSConnection):
+    """HTTPSConnection adding its connect and TLS handshake time
+    to the current metrics."""
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            super().connect()
+        finally:
+            record = current()
+            if record is not None:
+                record.connect += time.perf_counter() - start
+
+
+class IdleTimeoutPool(object):
+    """Connection pool closing, instead of reusing, the connections
+    kept alive for more than max_idle seconds, kept as long as the
+    server allows if None."""
+
+    max_idle = None
+
+    def _get_conn(self, timeout=None):
+        conn = super()._get_conn(timeout)
+        idle_since = getattr(conn, 'idle_since', None)
+        if self.max_idle is not None and idle_since is not None and \
+                time.monotonic() - idle_since > self.max_idle:
+            # reconnected by the next request
+            conn.close()
+        return conn
+
+    def _put_conn(self, conn):
+        if conn is not None:
+            conn.idle_since = time.monotonic()
+        super()._put_conn(conn)
+
+
+class TimedHTTPConnectionPool(IdleTimeoutPool, urllib3.HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(IdleTimeoutPool,
+                               urllib3.HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+class TimedHTTPAdapter(requests.adapters.HTTPAdapter):
+    """HTTPAdapter whose pools time the connections they open."""
+
+    def __init__(self, *args, max_idle=None, **kwargs):
+        """
+        :param max_idle: seconds a kept-alive connection may stay idle
+         before it is reconnected, see IdleTimeoutPool
+        """
+        self.max_idle = max_idle
+        super().__init__(*args, **kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        attrs = {'max_idle': self.max_idle}
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': type('TimedHTTPConnectionPool',
+                         (TimedHTTPConnectionPool,), attrs),
+            'https': type('TimedHTTPSConnectionPool',
+                          (TimedHTTPSConnectionPool,), attrs)
+        }
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of sorted values, q in [0, 1]."""
+    if not values:
+        return None
+    return values[max(0, math.ceil(q * len(values)) - 1)]
+
+
+class EndpointStats(object):
+    """Aggregated RequestMetrics of one method and endpoint."""
+
+    def __init__(self, max_samples):
+        self.count = 0
+        self.errors = 0
+        self.retries = 0
+        self.response_bytes = 0
+        self.statuses = collections.Counter()
+        self.cache_hits = collections.Counter()
+        self.sums = collections.Counter()
+        self.counts = collections.Counter()
+        self.samples = {phase: collections.deque(maxlen=max_samples)
+                        for phase in RequestMetrics.PHASES}
+
+    def add(self, record):
+        self.count += 1
+        self.errors += record.error is not None
+        self.retries += record.retries
+        self.response_bytes += record.response_size or 0
+        self.statuses[status_label(record)] += 1
+        if record.cache:
+            self.cache_hits[record.cache] += 1
+        for phase in RequestMetrics.PHASES:
+            value = getattr(record, phase)
+            if value is not None:
+                self.sums[phase] += value
+                self.counts[phase] += 1
+                self.samples[phase].append(value)
+
+    def phase(self, phase, quantiles):
+        values = sorted(self.samples[phase])
+        return {
+            'sum': self.sums[phase],
+            'count': self.counts[phase],
+            'quantiles': {q: percentile(values, q) for q in quantiles}
+        }
+
+
+def status_label(record):
+    if record.status is not None:
+        return str(record.status)
+    return record.cache or 'error'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"') \
+        .replace('\n', '\\n')
+
+
+class MetricsCollector(object):
+    """
+    In-memory aggregator of RequestMetrics per method and endpoint,
+    percentiles are computed over the latest max_samples requests.
+    """
+
+    QUANTILES = (0.5, 0.9, 0.99)
+
+    def __init__(self, max_samples=1024):
+        """
+        :param max_samples: durations kept per endpoint and phase
+        """
+        self.max_samples = max_samples
+        self._endpoints = {}
+        self._lock = threading.Lock()
+
+    def attach(self, gerrit):
+        """Listen to the requests of a Gerrit or GerritSession."""
+        getattr(gerrit, 'session', gerrit).add_listener(self)
+        return self
+
+    def __call__(self, record):
+        key = (record.method, record.endpoint)
+        with self._lock:
+            stats = self._endpoints.get(key)
+            if stats is None:
+                stats = self._endpoints[key] = \
+                    EndpointStats(self.max_samples)
+            stats.add(record)
+
+    def clear(self):
+        with self._lock:
+            self._endpoints.clear()
+
+    def summary(self):
+        """
+        Stats per endpoint, the ones taking most time first.
+        :return: list of dict with method, endpoint, count, errors,
+         retries, response_bytes, statuses, cache_hits, time and
+         phases {phase: {sum, count, quantiles: {quantile: seconds}}}
+        """
+        summary = []
+        with self._lock:
+            for (method, path), stats in self._endpoints.items():
+                phases = {phase: stats.phase(phase, self.QUANTILES)
+                          for phase in RequestMetrics.PHASES}
+                summary.append({
+                    'method': method,
+                    'endpoint': path,
+                    'count': stats.count,
+                    'errors': stats.errors,
+                    'retries': stats.retries,
+                    'response_bytes': stats.response_bytes,
+                    'statuses': dict(stats.statuses),
+                    'cache_hits': dict(stats.cache_hits),
+                    'time': phases['total']['sum'],
+                    'phases': phases
+                })
+        return sorted(summary, key=lambda x: -x['time'])
+
+    def report(self, top=20):
+        """Text table of the endpoints taking most time."""
+        lines = ['%7s %9s %8s %8s %8s %6s  %s' % (
+            'count', 'time(s)', 'p50(ms)', 'p90(ms)', 'p99(ms)', 'cached',
+            'endpoint')]
+        for item in self.summary()[:top]:
+            total = item['phases']['total']['quantiles']
+            lines.append('%7d %9.3f %8.1f %8.1f %8.1f %6d  %s %s' % (
+                item['count'], item['time'], total[0.5] * 1000,
+                total[0.9] * 1000, total[0.99] * 1000,
+                sum(item['cache_hits'].values()), item['method'],
+                item['endpoint']))
+        return '\n'.join(lines)
+
+    def prometheus(self, prefix='gerrit_client'):
+        """Export the stats in the Prometheus text format."""
+        requests_total, durations = [], []
+        counters = collections.defaultdict(list)
+        for item in self.summary():
+            labels = 'method="%s",endpoint="%s"' % (
+                _escape(item['method']), _escape(item['endpoint']))
+            for status, count in sorted(item['statuses'].items()):
+                requests_total.append('%s_requests_total{%s,status="%s"} %d'
+                                      % (prefix, labels, status, count))
+            for phase, stats in item['phases'].items():
+                if not stats['count']:
+                    continue
+                phase_labels = '%s,phase="%s"' % (labels, phase)
+                for q, value in stats['quantiles'].items():
+                    durations.append(
+                        '%s_request_duration_seconds{%s,quantile="%s"} %r'
+                        % (prefix, phase_labels, q, value))
+                durations.append('%s_request_duration_seconds_sum{%s} %r'
+                                 % (prefix, phase_labels, stats['sum']))
+                durations.append('%s_request_duration_seconds_count{%s} %d'
+                                 % (prefix, phase_labels, stats['count']))
+            for name in ('errors', 'retries', 'response_bytes'):
+                counters[name].append('%s_%s_total{%s} %d'
+                                      % (prefix, name, labels, item[name]))
+            for cache, count in sorted(item['cache_hits'].items()):
+                counters['cache_hits'].append(
+                    '%s_cache_hits_total{%s,cache="%s"} %d'
+                    % (prefix, labels, cache, count))
+        lines = ['# HELP %s_requests_total Requests by endpoint and status.'
+                 % prefix,
+                 '# TYPE %s_requests_total counter' % prefix]
+        lines.extend(requests_total)
+        lines.extend([
+            '# HELP %s_request_duration_seconds Request time by phase.'
+            % prefix,
+            '# TYPE %s_request_duration_seconds summary' % prefix])
+        lines.extend(durations)
+        for name in ('errors', 'retries', 'response_bytes', 'cache_hits'):
+            lines.append('# TYPE %s_%s_total counter' % (prefix, name))
+            lines.extend(counters[name])
+        return '\n'.join(lines) + '\n'
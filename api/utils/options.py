@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Date    : 2026-10-17 13:20:17
+# @Author  : Shanming Liu
+
+"""Planner of the `o=` options of change queries.
+
+https://gerrit-review.googlesource.com/Documentation/rest-api-changes.html#query-options
+"""
+
+import fnmatch
+
+# ChangeInfo field patterns and the options needed to get them,
+# fields out of this list are always returned
+FIELD_OPTIONS = [
+    ('labels', ['LABELS']),
+    ('labels.*.all', ['DETAILED_LABELS']),
+    ('labels.*.values', ['DETAILED_LABELS']),
+    ('permitted_labels', ['DETAILED_LABELS']),
+    ('removable_reviewers', ['DETAILED_LABELS']),
+    ('reviewers', ['DETAILED_LABELS']),
+    ('messages', ['MESSAGES']),
+    ('actions', ['CHANGE_ACTIONS']),
+    ('submittable', ['SUBMITTABLE']),
+    ('reviewed', ['REVIEWED']),
+    ('tracking_ids', ['TRACKING_IDS']),
+    ('problems', ['CHECK']),
+    ('submit_requirements', ['SUBMIT_REQUIREMENTS']),
+    ('current_revision', ['CURRENT_REVISION']),
+    ('current_revision.files', ['CURRENT_FILES']),
+    ('current_revision.commit', ['CURRENT_COMMIT']),
+    ('current_revision.commit.web_links', ['WEB_LINKS']),
+    ('current_revision.commit_with_footers', ['COMMIT_FOOTERS']),
+    ('current_revision.actions', ['CURRENT_ACTIONS']),
+    ('current_revision.fetch', ['DOWNLOAD_COMMANDS']),
+    ('current_revision.push_certificate', ['PUSH_CERTIFICATES']),
+    ('revisions', ['ALL_REVISIONS']),
+    ('revisions.*.files', ['ALL_FILES']),
+    ('revisions.*.commit', ['ALL_COMMITS']),
+    ('revisions.*.commit.web_links', ['WEB_LINKS']),
+    ('revisions.*.commit_with_footers', ['COMMIT_FOOTERS']),
+    ('revisions.*.fetch', ['DOWNLOAD_COMMANDS']),
+    ('revisions.*.push_certificate', ['PUSH_CERTIFICATES']),
+]
+
+# AccountInfo fields only sent with DETAILED_ACCOUNTS
+ACCOUNT_FIELDS = ('name', 'email', 'username', 'avatars', 'display_name')
+ACCOUNT_PATHS = ('owner', 'assignee', 'submitter', 'messages.author',
+                 'reviewers.*', 'labels.*', 'current_revision.uploader',
+                 'revisions.*.uploader')
+
+# keys of the maps under revisions and labels, to allow omitting them
+REVISION_FIELDS = ('_number', 'ref', 'created', 'uploader', 'kind', 'fetch',
+                   'commit', 'files', 'actions', 'commit_with_footers',
+                   'push_certificate', 'description', 'reviewed')
+LABEL_FIELDS = ('all', 'values', 'approved', 'rejected', 'recommended',
+                'disliked', 'blocking', 'value', 'default_value', 'optional')
+
+# an option making another one useless
+SUPERSEDES = {
+    'DETAILED_LABELS': 'LABELS',
+    'ALL_REVISIONS': 'CURRENT_REVISION',
+    'ALL_FILES': 'CURRENT_FILES',
+    'ALL_COMMITS': 'CURRENT_COMMIT',
+}
+
+
+def normalize_field(field):
+    """
+    Insert the wildcard of the map keys a field path may omit.
+    :Example:
+        >>> normalize_field('revisions.files')
+        >>> 'revisions.*.files'
+    """
+    parts = field.split('.')
+    if len(parts) > 1:
+        if parts[0] == 'revisions' and parts[1] in REVISION_FIELDS or \
+                parts[0] == 'labels' and parts[1] in LABEL_FIELDS:
+            parts.insert(1, '*')
+    return '.'.join(parts)
+
+
+def _matches(field, pattern):
+    return fnmatch.fnmatchcase(field, pattern) or \
+        fnmatch.fnmatchcase(field, pattern + '.*')
+
+
+def plan_options(fields, option=None):
+    """
+    Compute the minimal set of query options returning the given fields.
+    :param fields: dotted ChangeInfo field paths,
+     eg: ['labels', 'current_revision.files', 'owner.email']
+    :param option: options requested anyway, str or list
+    :return: sorted list of options,
+     eg: ['CURRENT_FILES', 'CURRENT_REVISION', 'DETAILED_ACCOUNTS', 'LABELS']
+    """
+    if isinstance(option, str):
+        option = [option]
+    options = set(option or [])
+    for field in fields:
+        field = normalize_field(field)
+        for pattern, needed in FIELD_OPTIONS:
+            if _matches(field, pattern):
+                options.update(needed)
+        head, _, last = field.rpartition('.')
+        if last in ACCOUNT_FIELDS and \
+                any(fnmatch.fnmatchcase(head, path) for path in ACCOUNT_PATHS):
+            options.add('DETAILED_ACCOUNTS')
+    for option, superseded in SUPERSEDES.items():
+        if option in options:
+            options.discard(superseded)
+    return sorted(options)
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Date    : 2026-10-17 16:52:30
+# @Author  : Shanming Liu
+
+"""Startup time of gerrit_cmd.py invocations measured with -X importtime.
+
+Runs the cli in fresh interpreters, without daemon, and sums the import
+time of everything the invocation loads after the interpreter startup,
+fire and the client included. Exits 1 when the command, `version` by
+default, exceeds the budget, or when --help imports a module only the
+commands need. The commands forwarded to a `serve` daemon load neither
+fire nor the client.
+
+Usage: python benchmarks/bench_cli_startup.py [budget in ms] [command]
+"""
+
+import os
+import pathlib
+import subprocess
+import sys
+import time
+
+BASEDIR = pathlib.Path(__file__).resolve().parents[1]
+
+# modules only the commands needing them may import
+HEAVY_MODULES = ('requests', 'yaml', 'tabulate', 'api.gerrit')
+
+
+def import_times(argv, repeat=5):
+    """Run gerrit_cmd.py argv in fresh interpreters and return the
+    {top level module: cumulative us} and the wall time in seconds
+    of the run loading the fastest."""
+    env = dict(os.environ, GERRIT_CMD_NO_DAEMON='1')
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        # the command may fail, eg: without server, its imports are done
+        proc = subprocess.run([sys.executable, '-X', 'importtime',
+                               'gerrit_cmd.py'] + argv, cwd=str(BASEDIR),
+                              env=env, stdout=subprocess.DEVNULL,
+                              stderr=subprocess.PIPE,
+                              universal_newlines=True)
+        wall = time.perf_counter() - start
+        times = {}
+        for line in proc.stderr.splitlines():
+            if not line.startswith('import time:') or 'cumulative' in line:
+                continue
+            _, cumulative, module = line[12:].split('|')
+            if module.strip() == 'site':
+                # imported at interpreter startup, before the cli
+                times = {}
+                continue
+            if not module.startswith('  '):
+                times[module.strip()] = int(cumulative)
+        if best is None or sum(times.values()) < sum(best[0].values()):
+            best = times, wall
+    return best
+
+
+def report(argv):
+    """Print the startup of gerrit_cmd.py argv,
+    return its imports {module: cumulative us}."""
+    times, wall = import_times(argv)
+    print('%-24s %8.1f ms imports, %6.1f ms wall'
+          % (' '.join(argv), sum(times.values()) / 1000, wall * 1000))
+    for module, cumulative in sorted(times.items(),
+                                     key=lambda x: -x[1])[:5]:
+        print('  %-22s %8.1f ms' % (module, cumulative / 1000))
+    return times
+
+
+def main():
+    budget = float(sys.argv[1]) if len(sys.argv) > 1 else 200
+    command = sys.argv[2:] or ['version']
+    total = sum(report(command).values()) / 1000
+    print('budget %.1f ms' % budget)
+    # fire loads its help formatting, the client must not load
+    times = report(['--help'])
+    loaded = [module for module in HEAVY_MODULES if module in times]
+    if loaded:
+        print('heavy modules imported by --help: %s' % ', '.join(loaded))
+    if total > budget or loaded:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Date    : 2026-10-17 11:48:09
+# @Author  : Shanming Liu
+
+"""Micro-benchmark of response decoding on a large CURRENT_FILES like body.
+
+Usage: python benchmarks/bench_decode.py [number of changes]
+"""
+
+import json
+import pathlib
+import sys
+import timeit
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+
+from api.utils import helper  # noqa: E402
+
+
+def make_body(count):
+    changes = []
+    for i in range(count):
+        files = {'src/module_%d/file_%d.py' % (i, j): {
+            'lines_inserted': j, 'lines_deleted': i % 7, 'size_delta': j * 3,
+            'size': 1000 + j} for j in range(20)}
+        changes.append({
+            'id': 'project~master~I%040x' % i, '_number': i,
+            'project': 'project', 'branch': 'master', 'status': 'NEW',
+            'subject': u'Change n°%d' % i,
+            'current_revision': '%040x' % i,
+            'revisions': {'%040x' % i: {'_number': 1, 'files': files}}})
+    return b")]}'\n" + json.dumps(changes).encode('utf-8')
+
+
+def legacy_decode(content):
+    # what GerritSession.send used to do with resp.text
+    text = content.decode('utf-8')
+    return json.loads(text.lstrip(")]}'"))
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    body = make_body(count)
+    print('body: %.1f MB, %d changes' % (len(body) / 2 ** 20, count))
+
+    def report(name, func):
+        best = min(timeit.repeat(lambda: func(body), number=1, repeat=5))
+        print('%-16s %8.1f ms' % (name, best * 1000))
+        return best
+
+    baseline = report('legacy', legacy_decode)
+    for backend in helper.JSON_BACKENDS:
+        try:
+            helper.set_json_backend(backend)
+        except ImportError:
+            print('%-16s not installed' % backend)
+            continue
+        assert helper.decode_content(body) == legacy_decode(body)
+        best = report(backend, helper.decode_content)
+        print('%-16s %8.2fx' % ('', baseline / best))
+
+
+if __name__ == '__main__':
+    main()
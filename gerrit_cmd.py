@@ -5,34 +5,263 @@
 # @Link    : http://example.org
 # @Version : $Id$
 
+import os
 import pathlib
 import json
+import socket
+import stat
 import sys
+import tempfile
 
-import yaml
-import fire
-import tabulate
-
-from api import Gerrit, GerritError
+# the heavy modules: fire, yaml, tabulate and requests through
+# api.gerrit, are imported by the commands needing them, this
+# keeps the startup of hooks calling the cli short
+from api.utils.exceptions import GerritError
 
 BASEDIR = pathlib.Path(__file__).parent
 
+# commands run locally even when a daemon is serving,
+# batch reads the stdin of the calling process
+LOCAL_COMMANDS = ('serve', 'batch')
+
+# url paths the daemon caches, changes are never cached as pushes
+# update them without any REST request invalidating the cache
+STATIC_ENDPOINTS = ('*/config/server/*', '*/accounts/*')
+
+# commands of batch mode and the GerritCmd methods returning their data
+BATCH_COMMANDS = {
+    'query_change': '_change',
+    'query_change_files': '_change_files',
+    'query_commit_files': '_commit_files',
+    'check_patch_is_mergeable': '_mergeable',
+    'set_review': '_set_review',
+}
+
+
+class CommandError(Exception):
+    """A command whose check failed, result keeps the response."""
+
+    def __init__(self, message, result=None):
+        super().__init__(message)
+        self.result = result
+
 
 def get_config():
     config_file = BASEDIR / 'config/gerrit.json'
-    return json.load(config_file.open())
+    with config_file.open() as in_file:
+        return json.load(in_file)
 
 
 def format_output(data, fmt_type='JSON'):
     if fmt_type == "JSON":
         data = json.dumps(data)
     elif fmt_type == "YAML":
+        import yaml
+
         data = yaml.safe_dump(data)
 
     return data
 
 
+# formats write_records outputs record by record
+STREAM_FORMATS = ('JSON', 'JSONL', 'YAML', 'CSV', 'TSV')
+
+
+def field_value(record, field):
+    """Value of a dotted field path of a record, eg: owner.email,
+    nested values are JSON encoded."""
+    value = record
+    for key in field.split('.'):
+        value = value.get(key) if isinstance(value, dict) else None
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    return value
+
+
+def write_records(records, fmt_type='JSONL', stream=None, fields=None):
+    """
+    Write records as soon as they are produced, without holding them.
+    JSON writes one array and YAML one list, the same documents
+    format_output gives for a list, JSONL one JSON object per line,
+    CSV and TSV one row per record after a header line.
+    :param records: iterable of dict
+    :param fmt_type: one of STREAM_FORMATS
+    :param stream: text file to write to, sys.stdout by default
+    :param fields: dotted field paths of the CSV and TSV columns,
+     the keys of the first record by default
+    :return: number of records written
+    """
+    stream = stream or sys.stdout
+    if fmt_type not in STREAM_FORMATS:
+        raise ValueError('Unknown output format: %s' % fmt_type)
+    count = 0
+    if fmt_type in ('CSV', 'TSV'):
+        import csv
+
+        writer = csv.writer(stream, delimiter=',' if fmt_type == 'CSV'
+                            else '\t', lineterminator='\n')
+        for record in records:
+            if count == 0:
+                fields = list(fields or record)
+                writer.writerow(fields)
+            writer.writerow([field_value(record, field) for field in fields])
+            count += 1
+        return count
+    if fmt_type == 'YAML':
+        import yaml
+
+        dumper = getattr(yaml, 'CSafeDumper', yaml.SafeDumper)
+    for record in records:
+        if fmt_type == 'JSON':
+            stream.write(', ' if count else '[')
+            stream.write(json.dumps(record))
+        elif fmt_type == 'JSONL':
+            stream.write(json.dumps(record) + '\n')
+        else:
+            # the items of a list are dumped one by one
+            stream.write(yaml.dump([record], Dumper=dumper))
+        count += 1
+        # print as soon as a page arrives, the next one may be slow
+        stream.flush()
+    if fmt_type == 'JSON':
+        stream.write(']\n' if count else '[]\n')
+    elif fmt_type == 'YAML' and not count:
+        stream.write('[]\n')
+    return count
+
+
+def socket_path():
+    """Unix socket of the `serve` daemon, $GERRIT_CMD_SOCKET or one
+    in a private directory per user in the runtime directory."""
+    if os.environ.get('GERRIT_CMD_SOCKET'):
+        return os.environ['GERRIT_CMD_SOCKET']
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR') or tempfile.gettempdir()
+    return os.path.join(runtime_dir, 'gerrit_cmd-%d' % os.getuid(),
+                        'daemon.sock')
+
+
+def owned(path, kind, mode=0o022):
+    """Whether path is a kind of file, eg: stat.S_ISSOCK, of this user
+    without any of the mode bits, by default the write ones of others."""
+    try:
+        info = os.lstat(path)
+    except OSError:
+        return False
+    return kind(info.st_mode) and info.st_uid == os.getuid() and \
+        not info.st_mode & mode
+
+
+def trusted_socket(path):
+    """Whether the daemon listening on path is run by this user,
+    the default socket must also be in a directory private to this user."""
+    if os.environ.get('GERRIT_CMD_SOCKET'):
+        return owned(path, stat.S_ISSOCK)
+    return owned(os.path.dirname(path), stat.S_ISDIR, 0o077) and \
+        owned(path, stat.S_ISSOCK)
+
+
+def forward(argv):
+    """
+    Run a command in the `serve` daemon and print its output.
+    :return: exit code of the command, None if no daemon is listening
+    """
+    path = socket_path()
+    if not os.path.exists(path):
+        return None
+    if not trusted_socket(path):
+        # anyone could have created it to read the commands
+        sys.stderr.write('Ignoring %s, not a socket of this user\n' % path)
+        return None
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(path)
+    except OSError:
+        client.close()
+        return None
+    streams = {'stdout': sys.stdout, 'stderr': sys.stderr}
+    with client:
+        request = {'argv': argv, 'cwd': os.getcwd()}
+        client.sendall(json.dumps(request).encode('utf-8') + b'\n')
+        client.shutdown(socket.SHUT_WR)
+        with client.makefile('rb') as in_file:
+            # output chunks as the command writes them, then its code
+            for line in in_file:
+                message = json.loads(line.decode('utf-8'))
+                if 'code' in message:
+                    return message['code']
+                try:
+                    for name, text in message.items():
+                        streams[name].write(text)
+                        streams[name].flush()
+                except BrokenPipeError:
+                    # the reader went away, eg: the output was piped
+                    # into head, which also stops the daemon command
+                    os.dup2(os.open(os.devnull, os.O_WRONLY),
+                            sys.stdout.fileno())
+                    return 1
+    sys.stderr.write('The daemon stopped before the end of the command\n')
+    return 1
+
+
+class ChunkWriter(object):
+    """Text stream sending what a command writes as {name: text}
+    JSON lines, on flush or once chunk_size characters are pending."""
+
+    def __init__(self, out_file, name, chunk_size=65536):
+        self.out_file = out_file
+        self.name = name
+        self.chunk_size = chunk_size
+        self._pending = []
+        self._size = 0
+
+    def write(self, text):
+        self._pending.append(text)
+        self._size += len(text)
+        if self._size >= self.chunk_size:
+            self.flush()
+        return len(text)
+
+    def flush(self):
+        if self._size:
+            text = ''.join(self._pending)
+            self._pending, self._size = [], 0
+            self.out_file.write(json.dumps({self.name: text})
+                                .encode('utf-8') + b'\n')
+
+
+def run_command(argv, cwd, stdout, stderr):
+    """Run a command in this process writing its output
+    to the text streams stdout and stderr, return its exit code."""
+    import contextlib
+
+    import fire
+
+    previous_cwd = os.getcwd()
+    code = 0
+    try:
+        with contextlib.redirect_stdout(stdout), \
+                contextlib.redirect_stderr(stderr):
+            if cwd:
+                os.chdir(cwd)
+            fire.Fire(GerritCmd, command=list(argv), name='gerrit_cmd.py')
+    except SystemExit as e:
+        if isinstance(e.code, int):
+            code = e.code
+        elif e.code is not None:
+            stderr.write('%s\n' % e.code)
+            code = 1
+    except Exception as e:
+        stderr.write('Error: %r\n' % e)
+        code = 1
+    finally:
+        os.chdir(previous_cwd)
+    return code
+
+
 class GerritCmd(object):
+    # warm client of the `serve` daemon, shared by the commands it runs
+    _served_gerrit = None
+
     def __init__(self, fmt_type='YAML', debug=False):
         """
         Gerrit central restful api wrappered command list.
@@ -42,23 +271,138 @@ class GerritCmd(object):
         :param fmt_type: Output format
         :param debug: Set logging level to DEBUG
         """
-        config = get_config()
-        self.gerrit = Gerrit(config['baseurl'],
-                             config['username'],
-                             config['password'],
-                             level='DEBUG' if debug else 'INFO')
         self.fmt_type = fmt_type
+        self._debug = debug
+        self._gerrit = None
+
+    @property
+    def gerrit(self):
+        """Gerrit client and its session, built by the first command
+        sending a request."""
+        return self._connect()
+
+    def _connect(self):
+        """Build the Gerrit client unless done already, return it."""
+        if self._gerrit is None:
+            self._gerrit = GerritCmd._served_gerrit or self._build_gerrit()
+        return self._gerrit
+
+    def _build_gerrit(self, **session_options):
+        from api.gerrit import Gerrit
+        from api.utils.cache import DiskCache
 
-    def query(self, query=None, limit=None, option=None):
+        config = get_config()
+        if config.get('cache_dir'):
+            session_options['disk_cache'] = DiskCache(config['cache_dir'])
+        return Gerrit(config['baseurl'],
+                      config['username'],
+                      config['password'],
+                      level='DEBUG' if self._debug else 'INFO',
+                      **session_options)
+
+    def serve(self, path=None, ttl=30):
+        """
+        Run as a daemon keeping a warm session and a response cache,
+        other invocations forward their command to it while it listens.
+        :param path: Unix socket path, default $GERRIT_CMD_SOCKET or
+         gerrit_cmd-<uid>/daemon.sock in the runtime directory
+        :param ttl: Seconds the server config and account responses
+         stay cached, 0 disables caching
         """
-        Fetch query result.
+        import signal
+        import socketserver
+
+        from api.utils.cache import ResponseCache
+
+        if not path:
+            path = socket_path()
+            if not os.environ.get('GERRIT_CMD_SOCKET'):
+                directory = os.path.dirname(path)
+                try:
+                    os.mkdir(directory, 0o700)
+                except FileExistsError:
+                    pass
+                if not owned(directory, stat.S_ISDIR, 0o077):
+                    print('%s is not a private directory of this user'
+                          % directory)
+                    sys.exit(1)
+        if os.path.lexists(path):
+            if not owned(path, stat.S_ISSOCK):
+                print('%s exists and is not a socket of this user' % path)
+                sys.exit(1)
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(path)
+            except OSError:
+                # left over by a daemon which did not stop cleanly
+                os.unlink(path)
+            else:
+                print('A daemon is already serving on %s' % path)
+                sys.exit(1)
+            finally:
+                probe.close()
+        GerritCmd._served_gerrit = self._build_gerrit(
+            cache=ResponseCache(ttl=0, ttls={
+                pattern: ttl for pattern in STATIC_ENDPOINTS
+            }) if ttl else None)
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                line = self.rfile.readline()
+                if not line:
+                    # probe of a starting daemon
+                    return
+                request = json.loads(line.decode('utf-8'))
+                stdout = ChunkWriter(self.wfile, 'stdout')
+                stderr = ChunkWriter(self.wfile, 'stderr')
+                try:
+                    code = run_command(request['argv'], request.get('cwd'),
+                                       stdout, stderr)
+                    stdout.flush()
+                    stderr.flush()
+                    self.wfile.write(json.dumps({'code': code})
+                                     .encode('utf-8') + b'\n')
+                except OSError:
+                    # the client went away, eg: its output was piped
+                    # into head
+                    pass
+
+        # one command at a time, they share the process stdout and cwd,
+        # the socket is created only accessible to this user
+        umask = os.umask(0o177)
+        try:
+            server = socketserver.UnixStreamServer(path, Handler)
+        finally:
+            os.umask(umask)
+        signal.signal(signal.SIGTERM, lambda *args: sys.exit(0))
+        print('Serving on %s' % path)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            os.unlink(path)
+
+    def query(self, query=None, limit=None, option=None, fields=None):
+        """
+        Fetch query result, printed page by page in fmt_type:
+        JSON, JSONL, YAML, CSV or TSV.
         :param query: Query string
         :param limit: Limit the returned results.
         :param option: Additional fields can be obtained by adding o parameters
+        :param fields: Comma separated fields, the CSV and TSV columns,
+         eg: _number,owner.email,labels; the options they need are added
         """
-        resp = self.gerrit.changes(query, limit, option)
-        output = format_output(resp, self.fmt_type)
-        print(output)
+        import itertools
+
+        if isinstance(fields, str):
+            fields = fields.split(',')
+        page_size = min(limit, 500) if limit else 500
+        changes = self.gerrit.iter_changes(query, page_size, option,
+                                           stream=True, fields=fields)
+        write_records(itertools.islice(changes, limit), self.fmt_type,
+                      fields=fields)
 
     def query_commit_files(self, commit):
         """
@@ -67,24 +411,30 @@ class GerritCmd(object):
         :return: list of commit change files
         """
         try:
-            revision = self.gerrit.get_revision(commit)
+            file_list = self._commit_files(commit)
         except GerritError as e:
             print('Error: %s' % str(e))
             sys.exit(1)
-        file_list = revision.files()
-        for name in file_list.keys():
+        for name in file_list:
             print(name)
 
+    def _commit_files(self, commit):
+        revision = self.gerrit.get_revision(commit)
+        return list(revision.files())
+
     def query_change(self, change_id, **params):
         """
         Query gerrit central change id merge status
         :param change_id: ChangeId
         :return: change status
         """
-        resp = self.gerrit.change(change_id).info(**params)
+        resp = self._change(change_id, **params)
         output = format_output(resp, self.fmt_type)
         print(output)
 
+    def _change(self, change_id, **params):
+        return self.gerrit.change(change_id).info(**params)
+
     def query_change_files(self, change_id):
         """
         Fetch all files from change id,
@@ -92,13 +442,15 @@ class GerritCmd(object):
         :param change_id: ChangeId
         :return: Sorted file names
         """
+        for name in self._change_files(change_id):
+            print(name)
+
+    def _change_files(self, change_id):
         change = self.gerrit.change(change_id)
         resp = change.info(o=["CURRENT_REVISION",
                               "CURRENT_FILES"])
         current_revision = resp['current_revision']
-        file_list = resp['revisions'][current_revision]['files']
-        for name in file_list.keys():
-            print(name)
+        return list(resp['revisions'][current_revision]['files'])
 
     def set_review(self, revision_id,
                    message='',
@@ -113,21 +465,28 @@ class GerritCmd(object):
             eg: ['rebase','submit','publish','delete']
         :param kwargs: review optional args.
         """
+        try:
+            self._set_review(revision_id, message, code_review, verified,
+                             command)
+        except (GerritError, CommandError):
+            print('Set review failed')
+            sys.exit(1)
+
+    def _set_review(self, revision_id, message='', code_review=0,
+                    verified=0, command=None):
         revision = self.gerrit.get_revision(revision_id)
         labels = {}
         if code_review:
             labels['Code-Review'] = code_review
         if verified:
             labels['Verified'] = verified
-        try:
-            resp = revision.set_review(message=message,
-                                       labels=labels)
-            assert labels == resp['labels']
-            if command and getattr(revision, command):
-                getattr(revision, command)()
-        except (GerritError, AssertionError):
-            print('Set review failed')
-            sys.exit(1)
+        resp = revision.set_review(message=message,
+                                   labels=labels)
+        if labels != resp.get('labels', {}):
+            raise CommandError('Labels not set', resp)
+        if command and getattr(revision, command):
+            getattr(revision, command)()
+        return resp
 
     def create_branch(self, project_name, branch_name, revision=None):
         """
@@ -169,11 +528,23 @@ class GerritCmd(object):
             print(msg + 'successful')
 
     def ls_members(self, group_name):
+        """
+        List the members of a group, as a table or,
+        with fmt_type JSONL, CSV or TSV, streamed row by row.
+        :param group_name: The name of the group.
+        """
         group = self.gerrit.groups(query='name:{}'.format(group_name),
                                    ret_type=True)[0]
+        fields = ['_account_id', 'username', 'name', 'email']
+        if self.fmt_type in ('JSONL', 'CSV', 'TSV'):
+            write_records(group.iter_members(), self.fmt_type,
+                          fields=fields)
+            return
+
+        import tabulate
+
         members = group.members()
         names = ['id', 'username', 'full name', 'email']
-        fields = ['_account_id', 'username', 'name', 'email']
         table_rows = [[row[i] for i in fields] for row in members]
         print(tabulate.tabulate(table_rows, headers=names, tablefmt='plain'))
 
@@ -220,15 +591,92 @@ class GerritCmd(object):
             sys.exit(1)
 
     def check_patch_is_mergeable(self, revision_id):
+        try:
+            self._mergeable(revision_id)
+        except CommandError as e:
+            print(str(e))
+            sys.exit(1)
+        print('Revision[%s] can be merged' % revision_id)
+
+    def _mergeable(self, revision_id):
         revision = self.gerrit.get_revision(revision_id)
         merge_info = revision.mergeable()
         if not merge_info['mergeable']:
-            print('Revision[%s] can not be merged' % revision_id)
+            raise CommandError('Revision[%s] can not be merged'
+                               % revision_id, merge_info)
+        return merge_info
+
+    def batch(self, command=None, file='-', workers=8):
+        """
+        Run commands for many inputs concurrently over one session,
+        printing a JSON line per input as soon as it completes:
+        {"index", "input", "status", "result", "error", "elapsed"},
+        status is 0 on success and 1 on failure, like the exit code.
+        :param command: Command run for the plain input lines, one of
+         query_change, query_change_files, query_commit_files,
+         check_patch_is_mergeable, set_review
+        :param file: Input file, - for stdin. A line is either an id
+         passed to command, or a JSON record
+         {"command": ..., "args": [...], "kwargs": {...}}
+        :param workers: Max number of inputs run at the same time
+        """
+        from api.utils import helper
+
+        def read_records():
+            in_file = sys.stdin if file == '-' else open(file)
+            try:
+                for line in in_file:
+                    if line.strip():
+                        yield self._batch_record(line)
+            finally:
+                if in_file is not sys.stdin:
+                    in_file.close()
+
+        def run(record):
+            name = str(record.get('command') or command).replace('-', '_')
+            if name not in BATCH_COMMANDS:
+                raise CommandError('Not a batch command: %s' % name)
+            method = getattr(self, BATCH_COMMANDS[name])
+            return method(*record.get('args', []),
+                          **record.get('kwargs', {}))
+
+        # the workers share one client, build it before they start
+        self._connect()
+        failed = 0
+        for index, result in helper.iter_stream(run, read_records(),
+                                                workers):
+            error = result.error
+            failed += error is not None
+            output = {
+                'index': index,
+                'input': result.item,
+                'status': 0 if error is None else 1,
+                'result': getattr(error, 'result', result.result),
+                'error': str(error) if error is not None else None,
+                'elapsed': round(result.elapsed, 3)
+            }
+            print(json.dumps(output), flush=True)
+        if failed:
             sys.exit(1)
-        print('Revision[%s] can be merged' % revision_id)
+
+    @staticmethod
+    def _batch_record(line):
+        line = line.strip()
+        if line.startswith('{'):
+            return json.loads(line)
+        return {'args': [line]}
 
 
 def main():
+    argv = sys.argv[1:]
+    if argv and not set(argv) & set(LOCAL_COMMANDS) and \
+            not os.environ.get('GERRIT_CMD_NO_DAEMON'):
+        code = forward(argv)
+        if code is not None:
+            sys.exit(code)
+
+    import fire
+
     fire.Fire(GerritCmd)
 
 
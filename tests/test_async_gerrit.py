@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Date    : 2026-10-18 11:26:03
+# @Author  : Shanming Liu
+
+import asyncio
+
+from api.async_gerrit import AsyncGerrit
+
+
+class Session(object):
+    def __init__(self, responses):
+        self.responses = responses
+        self.urls = []
+
+    async def get(self, url, params=None):
+        self.urls.append(url)
+        return self.responses[url.split('/a/', 1)[1]]
+
+
+def gerrit(responses):
+    gerrit = AsyncGerrit('http://gerrit')
+    gerrit.session = Session(responses)
+    return gerrit
+
+
+async def collect(items):
+    return [item async for item in items]
+
+
+def test_iter_branches():
+    client = gerrit({'projects/app/branches': [
+        {'ref': 'refs/heads/master'}, {'ref': 'refs/heads/release/1.0'}]})
+    branches = asyncio.run(collect(client.project('app').iter_branches()))
+    assert [branch.branch_name for branch in branches] == \
+        ['master', 'release/1.0']
+
+
+def test_iter_members():
+    client = gerrit({'groups/dev/members?recursive': [
+        {'_account_id': 7, 'name': 'jdoe'}]})
+    members = asyncio.run(collect(client.group('dev').iter_members(
+        recursive=True, ret_type=True)))
+    assert [member.account_id for member in members] == [7]
+    assert members[0]['name'] == 'jdoe'
@@ -0,0 +1,233 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Date    : 2026-10-18 09:12:40
+# @Author  : Shanming Liu
+
+import json
+import random
+import threading
+import time
+
+import pytest
+
+from api.utils import helper, options
+
+
+def split(body, rng):
+    """Cut body into chunks at random offsets."""
+    cuts = sorted(rng.sample(range(1, len(body)), min(len(body) - 1,
+                                                      rng.randint(1, 8))))
+    return [body[start:end]
+            for start, end in zip([0] + cuts, cuts + [len(body)])]
+
+
+def random_value(rng, depth=0):
+    kind = rng.choice(['int', 'float', 'exp', 'str', 'const', 'list',
+                       'dict'] if depth < 2 else ['int', 'float', 'exp'])
+    if kind == 'int':
+        return rng.randint(-10 ** 6, 10 ** 6)
+    if kind == 'float':
+        return round(rng.uniform(-1000, 1000), rng.randint(1, 6))
+    if kind == 'exp':
+        return float('%de%d' % (rng.randint(1, 9), rng.randint(-9, 9)))
+    if kind == 'str':
+        return ''.join(rng.choice('ab"\\é ,]}') for _ in range(5))
+    if kind == 'const':
+        return rng.choice([True, False, None])
+    if kind == 'list':
+        return [random_value(rng, depth + 1) for _ in range(3)]
+    return {'k%d' % i: random_value(rng, depth + 1) for i in range(3)}
+
+
+@pytest.mark.parametrize('chunks, expected', [
+    ([b'[7, 12', b'.5, 3]'], [7, 12.5, 3]),
+    ([b'[7, 12.', b'5, 3]'], [7, 12.5, 3]),
+    ([b")]}'", b'\n[1e', b'-05]'], [1e-05]),
+    ([b'[1E+', b'2]'], [100.0]),
+    ([b'[-', b'3]'], [-3]),
+    ([b'{"a": 1', b'0}'], [('a', 10)]),
+])
+def test_iter_json_items_cut_numbers(chunks, expected):
+    assert list(helper.iter_json_items(chunks)) == expected
+
+
+def test_iter_json_items_random_splits():
+    rng = random.Random(20261018)
+    for _ in range(500):
+        value = [random_value(rng) for _ in range(rng.randint(1, 6))]
+        if rng.random() < 0.3:
+            value = {'k%d' % i: item for i, item in enumerate(value)}
+        body = json.dumps(value, ensure_ascii=False).encode('utf-8')
+        if rng.random() < 0.5:
+            body = helper.XSSI_PREFIX + body
+        expected = list(value.items()) if isinstance(value, dict) else value
+        assert list(helper.iter_json_items(split(body, rng))) == expected
+
+
+def test_iter_json_items_truncated():
+    with pytest.raises(ValueError):
+        list(helper.iter_json_items([b'[1, 2', b', 3']))
+
+
+class Session(object):
+    def __init__(self, data):
+        self.data = data
+        self.urls = []
+
+    def get(self, url, params=None):
+        self.urls.append(url)
+        return dict(self.data)
+
+
+class Gerrit(object):
+    baseurl = 'http://gerrit/a'
+
+    def __init__(self, data):
+        self.session = Session(data)
+
+
+class Entity(helper.GerritMixin):
+    __slots__ = ()
+
+    FIELDS = frozenset(['_number', 'subject'])
+
+
+def test_gerrit_mixin_loads_known_fields_once():
+    gerrit = Gerrit({'_number': 7, 'subject': 'fix', 'extra': 1})
+    entity = Entity(gerrit, '/changes/7')
+    assert entity._number == 7
+    assert entity.subject == 'fix'
+    assert entity.extra == 1
+    assert gerrit.session.urls == ['http://gerrit/a/changes/7']
+
+
+def test_gerrit_mixin_unknown_name_sends_nothing():
+    gerrit = Gerrit({'_number': 7})
+    entity = Entity(gerrit, '/changes/7', {'subject': 'fix'})
+    assert not hasattr(entity, 'subjet')
+    assert not hasattr(entity, '_private')
+    assert entity.subject == 'fix'
+    assert gerrit.session.urls == []
+
+
+class PagedSession(object):
+    """Serves 10 changes, at most cap per page."""
+
+    def __init__(self, cap):
+        self.cap = cap
+        self.pages = []
+
+    def get(self, url, params=None):
+        start, size = params['S'], min(params['n'] or self.cap, self.cap)
+        self.pages.append((start, params['n']))
+        items = [{'_number': number}
+                 for number in range(start, min(start + size, 10))]
+        if items and start + size < 10:
+            items[-1]['_more_changes'] = True
+        return items
+
+
+@pytest.mark.parametrize('page_size', [None, 3, 5])
+def test_paginate_prefetch_capped_pages(page_size):
+    session = PagedSession(cap=3)
+    items = helper.paginate(session, 'changes/', more_key='_more_changes',
+                            page_size=page_size, prefetch=2)
+    assert [item['_number'] for item in items] == list(range(10))
+    # no speculative page fetched at a wrong offset
+    starts = [start for start, _ in session.pages]
+    assert [start for start in starts if start % 3] == []
+    assert len(starts) == len(set(starts))
+
+
+def test_shared_session_per_host_and_user():
+    first = helper.GerritSession.shared('https://shared-1/r', 'u', 'p',
+                                        pool_maxsize=4)
+    assert helper.GerritSession.shared('https://shared-1', 'u', 'p',
+                                       pool_maxsize=4) is first
+    assert helper.GerritSession.shared('https://shared-1', 'v', 'p',
+                                       pool_maxsize=4) is not first
+    assert all('p' not in key for key in helper.GerritSession._shared)
+
+
+def test_shared_session_conflicting_options():
+    helper.GerritSession.shared('https://shared-2', 'u', 'p', retries=2)
+    with pytest.raises(ValueError, match='retries'):
+        helper.GerritSession.shared('https://shared-2', 'u', 'p')
+
+
+def test_iter_stream_yields_before_input_ends():
+    arrived = threading.Event()
+
+    def items():
+        yield 1
+        # the first result is yielded while the input is still open
+        assert arrived.wait(5)
+        yield 2
+
+    results = []
+    for index, result in helper.iter_stream(lambda item: item * 10,
+                                            items(), workers=2):
+        results.append((index, result.result))
+        arrived.set()
+    assert sorted(results) == [(0, 10), (1, 20)]
+
+
+def test_iter_stream_bounded_backlog():
+    read = []
+
+    def items():
+        for item in range(20):
+            read.append(item)
+            yield item
+
+    stream = helper.iter_stream(lambda item: item, items(),
+                                workers=1, backlog=2)
+    next(stream)
+    time.sleep(0.1)
+    assert len(read) <= 4
+    assert len(list(stream)) == 19
+
+
+def test_iter_stream_input_error_after_results():
+    def items():
+        yield 1
+        raise ValueError('bad line')
+
+    stream = helper.iter_stream(lambda item: item, items())
+    assert next(stream)[1].result == 1
+    with pytest.raises(ValueError, match='bad line'):
+        next(stream)
+
+
+@pytest.mark.parametrize('fields, expected', [
+    (['subject', 'owner._account_id'], []),
+    (['labels', 'current_revision.files', 'owner.email'],
+     ['CURRENT_FILES', 'CURRENT_REVISION', 'DETAILED_ACCOUNTS', 'LABELS']),
+    (['messages.author.name'], ['DETAILED_ACCOUNTS', 'MESSAGES']),
+    (['revisions.files'], ['ALL_FILES', 'ALL_REVISIONS']),
+    (['revisions.*.commit.web_links'],
+     ['ALL_COMMITS', 'ALL_REVISIONS', 'WEB_LINKS']),
+    (['labels.Code-Review.all.email'],
+     ['DETAILED_ACCOUNTS', 'DETAILED_LABELS']),
+])
+def test_plan_options_fields(fields, expected):
+    assert options.plan_options(fields) == expected
+
+
+@pytest.mark.parametrize('fields, option, expected', [
+    (['labels', 'labels.all'], None, ['DETAILED_LABELS']),
+    (['current_revision.files', 'revisions.files'], None,
+     ['ALL_FILES', 'ALL_REVISIONS']),
+    (['current_revision.commit'], 'ALL_COMMITS',
+     ['ALL_COMMITS', 'CURRENT_REVISION']),
+    (['subject'], ['LABELS', 'DETAILED_LABELS'], ['DETAILED_LABELS']),
+])
+def test_plan_options_superseded_pruned(fields, option, expected):
+    assert options.plan_options(fields, option) == expected
+
+
+def test_normalize_field_map_keys():
+    assert options.normalize_field('revisions.files') == 'revisions.*.files'
+    assert options.normalize_field('labels.values') == 'labels.*.values'
+    assert options.normalize_field('revisions.abc123.files') == \
+        'revisions.abc123.files'
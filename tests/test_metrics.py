@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Date    : 2026-10-18 16:02:51
+# @Author  : Shanming Liu
+
+import datetime
+import io
+
+import requests
+
+from api.utils import helper
+from api.utils.metrics import MetricsCollector, RequestMetrics
+
+
+def record(url, status=200, total=0.5, size=10, cache=None):
+    item = RequestMetrics('GET', url)
+    item.status, item.cache, item.response_size = status, cache, size
+    item.finish()
+    item.total = total
+    return item
+
+
+def test_collector_summary_per_endpoint():
+    collector = MetricsCollector()
+    collector(record('https://host/a/changes/1/detail', total=0.1))
+    collector(record('https://host/a/changes/2/detail', total=0.3))
+    collector(record('https://host/a/accounts/self', status=None,
+                     total=0.0, cache='memory'))
+    first, second = collector.summary()
+    assert (first['endpoint'], first['count']) == \
+        ('/a/changes/{id}/detail', 2)
+    assert first['response_bytes'] == 20
+    assert first['phases']['total']['quantiles'][0.5] == 0.1
+    assert first['phases']['total']['quantiles'][0.99] == 0.3
+    assert second['cache_hits'] == {'memory': 1}
+
+
+def test_collector_prometheus():
+    collector = MetricsCollector()
+    collector(record('https://host/a/changes/1/detail', total=0.25))
+    collector(record('https://host/a/changes/"x"', status=404))
+    lines = collector.prometheus(prefix='gc').splitlines()
+    assert 'gc_requests_total{method="GET",' \
+           'endpoint="/a/changes/{id}/detail",status="200"} 1' in lines
+    assert 'gc_request_duration_seconds{method="GET",' \
+           'endpoint="/a/changes/{id}/detail",phase="total",' \
+           'quantile="0.5"} 0.25' in lines
+    assert 'gc_response_bytes_total{method="GET",' \
+           'endpoint="/a/changes/{id}/detail"} 10' in lines
+    # phases not measured are not exported
+    assert not [line for line in lines if 'phase="decode"' in line]
+    assert '# TYPE gc_request_duration_seconds summary' in lines
+
+
+class BodyAdapter(requests.adapters.BaseAdapter):
+    def __init__(self, body):
+        super().__init__()
+        self.body = body
+
+    def send(self, request, **kwargs):
+        resp = requests.Response()
+        resp.status_code, resp.url = 200, request.url
+        resp.raw = io.BytesIO(self.body)
+        resp.elapsed = datetime.timedelta(0)
+        return resp
+
+    def close(self):
+        pass
+
+
+def test_streamed_response_measured_once_consumed():
+    records = []
+    session = helper.GerritSession('u', 'p', listeners=[records.append])
+    session.mount('https://', BodyAdapter(b")]}'\n[1, 2, 3]"))
+    items = session.iter_items('https://host/a/changes/')
+    assert next(items) == 1
+    assert records == []
+    assert list(items) == [2, 3]
+    item, = records
+    assert item.response_size == 14
+    assert item.download is not None and item.total is not None
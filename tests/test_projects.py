@@ -0,0 +1,34 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Date    : 2026-10-18 10:05:17
+# @Author  : Shanming Liu
+
+import pytest
+
+from api.projects import Project
+
+
+class Gerrit(object):
+    baseurl = 'http://gerrit'
+
+
+@pytest.mark.parametrize('name', ['release/1.0', 'refs/heads/release/1.0'])
+def test_branch_with_slashes(name):
+    branch = Project(Gerrit(), 'tools/app').branch(name)
+    assert branch.branch_name == 'release/1.0'
+    assert branch.ref == 'refs/heads/release/1.0'
+    assert branch.path == \
+        '/a/projects/tools%2Fapp/branches/release%2F1.0'
+
+
+def test_branch_outside_heads():
+    branch = Project(Gerrit(), 'app').branch('refs/meta/config')
+    assert branch.ref == 'refs/meta/config'
+    assert branch.path == '/a/projects/app/branches/refs%2Fmeta%2Fconfig'
+
+
+@pytest.mark.parametrize('name', ['v1/rc1', 'refs/tags/v1/rc1'])
+def test_tag_with_slashes(name):
+    tag = Project(Gerrit(), 'app').tag(name)
+    assert tag.tag_id == 'v1/rc1'
+    assert tag.path == '/a/projects/app/tags/v1%2Frc1'
@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Date    : 2026-10-18 12:14:09
+# @Author  : Shanming Liu
+
+import logging
+import time
+
+from api.review import ReviewBatcher
+
+
+class Revision(object):
+    def __init__(self, change_id):
+        self.change_id = change_id
+
+    def set_review(self, **review):
+        return dict(review, change=self.change_id)
+
+
+class Gerrit(object):
+    logger = logging.getLogger('test_review')
+
+    def revision(self, change_id, revision_id):
+        return Revision(change_id)
+
+
+def test_reviews_merged_per_revision():
+    batcher = ReviewBatcher(Gerrit())
+    batcher.add(1, message='a', labels={'Verified': -1})
+    batcher.add(1, message='b', labels={'Verified': 1})
+    results = batcher.flush()
+    assert [result.result for result in results] == [
+        {'message': 'a\n\nb', 'labels': {'Verified': 1}, 'change': 1}]
+
+
+def test_results_are_bounded():
+    batcher = ReviewBatcher(Gerrit(), max_pending=1, max_results=2)
+    for number in range(5):
+        batcher.add(number, message='m')
+    assert [result.item[0] for result in batcher.results] == [3, 4]
+
+
+def test_on_result_error_is_logged_from_timer(caplog):
+    def fail(result):
+        raise RuntimeError('boom')
+
+    batcher = ReviewBatcher(Gerrit(), flush_interval=0.01, on_result=fail)
+    with caplog.at_level(logging.ERROR, 'test_review'):
+        batcher.add(1, message='m')
+        for _ in range(100):
+            if caplog.records:
+                break
+            time.sleep(0.01)
+    assert 'on_result failed on the review of 1 current' in caplog.text
+    assert 'boom' in caplog.text
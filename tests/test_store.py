@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Date    : 2026-10-18 10:41:52
+# @Author  : Shanming Liu
+
+import sqlite3
+
+import pytest
+
+from api.store import ChangeStore
+
+VALUES = {'-1': 'Fails', ' 0': 'No score', '+1': 'Verified'}
+
+
+def change(number, labels=None, files=()):
+    return {
+        '_number': number,
+        'change_id': 'I%d' % number,
+        'project': 'app',
+        'branch': 'master',
+        'status': 'NEW',
+        'subject': 'change %d' % number,
+        'updated': '2026-10-18 10:00:%02d.000000000' % number,
+        'current_revision': 'rev%d' % number,
+        'revisions': {'rev%d' % number: {
+            '_number': 1, 'files': {path: {} for path in files}}},
+        'labels': labels or {}
+    }
+
+
+@pytest.fixture
+def store():
+    store = ChangeStore()
+    store.load([
+        change(1, {'Verified': {'all': [{'_account_id': 7, 'value': 1}],
+                                'values': VALUES}},
+               files=['src/api/a.py', 'README']),
+        change(2, {'Verified': {'rejected': {'_account_id': 7}}},
+               files=['docs/a.py.md']),
+        change(3, {'Verified': {'all': [{'_account_id': 7, 'value': -1}],
+                                'values': VALUES}},
+               files=['src/api/b.py'])
+    ])
+    yield store
+    store.close()
+
+
+def numbers(store, query):
+    return sorted(info['_number'] for info in store.query(query))
+
+
+@pytest.mark.parametrize('query, expected', [
+    ('label:Verified+1', [1]),
+    ('label:Verified-1', [3]),
+    ('label:Verified-2', []),
+    ('label:Verified=approved', [1]),
+    ('label:Verified=MAX', [1]),
+    ('label:Verified=rejected', [2, 3]),
+    ('label:Verified=MIN -label:Verified-1', [2]),
+])
+def test_label(store, query, expected):
+    assert numbers(store, query) == expected
+
+
+def test_label_unknown_state(store):
+    with pytest.raises(ValueError):
+        store.query('label:Verified=ok')
+
+
+@pytest.mark.parametrize('query, expected', [
+    ('file:a.py', [1]),
+    ('file:src/api/a.py', [1]),
+    ('file:api', [1, 3]),
+    ('file:src/api', [1, 3]),
+    ('file:pi', []),
+    ('file:a_py', []),
+    ('file:^docs/', [2]),
+    ('-file:api', [2]),
+])
+def test_file(store, query, expected):
+    assert numbers(store, query) == expected
+
+
+@pytest.mark.parametrize('query', [
+    'owner:self', 'after:1d', 'before:2h', 'change:app~master~I1',
+    'is:starred', 'status:reviewed', 'reviewer:jdoe'])
+def test_unsupported_search(store, query):
+    with pytest.raises(ValueError):
+        store.query(query)
+
+
+def test_regex_search(store):
+    assert numbers(store, 'project:^a.p branch:^mas') == [1, 2, 3]
+    assert numbers(store, 'branch:^rel') == []
+
+
+def test_reopen(tmp_path):
+    path = str(tmp_path / 'changes.sqlite')
+    ChangeStore(path).load([change(2)])
+    assert numbers(ChangeStore(path), 'change:2') == [2]
+
+
+@pytest.mark.parametrize('version, table', [(0, 'votes'), (7, None)])
+def test_foreign_database(tmp_path, version, table):
+    path = str(tmp_path / 'other.sqlite')
+    db = sqlite3.connect(path)
+    if table:
+        db.execute('CREATE TABLE %s (id INTEGER)' % table)
+    db.execute('PRAGMA user_version = %d' % version)
+    db.commit()
+    db.close()
+    with pytest.raises(ValueError):
+        ChangeStore(path)
+    db = sqlite3.connect(path)
+    assert db.execute('PRAGMA user_version').fetchone()[0] == version
+    db.close()
@@ -0,0 +1,41 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Date    : 2026-10-18 11:58:36
+# @Author  : Shanming Liu
+
+from api.sync import ChangeSync
+
+
+class Gerrit(object):
+    def __init__(self, changes):
+        self.changes = changes
+        self.queries = []
+
+    def iter_changes(self, query, page_size=None, option=None):
+        self.queries.append(query)
+        if query.startswith('NOT'):
+            return iter([])
+        return iter(self.changes)
+
+
+def test_poll_queries_after_in_utc():
+    gerrit = Gerrit([{'_number': 1,
+                      'updated': '2026-10-18 10:00:05.000000000'}])
+    sync = ChangeSync(gerrit, 'status:open', reconcile_interval=None)
+    sync.full_sync()
+    updated, removed = sync.poll()
+    assert gerrit.queries[1:] == [
+        '(status:open) after:"2026-10-18 10:00:04 +0000"',
+        'NOT (status:open) after:"2026-10-18 10:00:04 +0000"']
+    assert [info['_number'] for info in updated] == [1]
+    assert removed == []
+
+
+def test_poll_reconciles_deleted_changes():
+    gerrit = Gerrit([{'_number': 1,
+                      'updated': '2026-10-18 10:00:05.000000000'}])
+    sync = ChangeSync(gerrit, 'status:open', reconcile_interval=0)
+    sync.changes[2] = {'_number': 2}
+    sync.high_water = '2026-10-18 09:00:00.000000000'
+    assert sync.poll()[1] == [2]
+    assert gerrit.queries[-1] == 'status:open'